@@ -1,5 +1,7 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import MetaData, event, inspect, text
+from sqlalchemy.schema import CreateTable
 import os
 
 # Database URL
@@ -8,6 +10,15 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./whatido.db")
 # Create async engine
 engine = create_async_engine(DATABASE_URL, echo=True)
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """WAL lets API workers read while the ingestion daemon writes"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
 # Create async session maker
 AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
@@ -16,10 +27,50 @@ AsyncSessionLocal = async_sessionmaker(
 class Base(DeclarativeBase):
     pass
 
+def _add_missing_columns(sync_conn):
+    """Add columns introduced after a table already existed"""
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=sync_conn.dialect)
+                sync_conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+def _create_missing_indexes(sync_conn):
+    """Create indexes added after a table already existed"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+def _enable_sqlite_autoincrement(sync_conn):
+    """Rebuild tables that gained AUTOINCREMENT, which SQLite cannot add in place"""
+    if sync_conn.dialect.name != "sqlite":
+        return
+    for table in Base.metadata.sorted_tables:
+        if not table.dialect_options["sqlite"]["autoincrement"]:
+            continue
+        sql = sync_conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table.name}
+        ).scalar()
+        if sql is None or "AUTOINCREMENT" in sql.upper():
+            continue
+        # Copy into a new table and swap it in; renaming the old one would
+        # rewrite the foreign keys that point at it. Indexes are recreated after.
+        rebuilt = table.to_metadata(MetaData(), name=f"_rebuild_{table.name}")
+        columns = ", ".join(column.name for column in table.columns)
+        sync_conn.execute(CreateTable(rebuilt))
+        sync_conn.execute(text(f"INSERT INTO {rebuilt.name} ({columns}) SELECT {columns} FROM {table.name}"))
+        sync_conn.execute(text(f"DROP TABLE {table.name}"))
+        sync_conn.execute(text(f"ALTER TABLE {rebuilt.name} RENAME TO {table.name}"))
+
 async def init_db():
     """Initialize database tables"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_enable_sqlite_autoincrement)
+        await conn.run_sync(_create_missing_indexes)
 
 async def get_db():
     """Get database session"""
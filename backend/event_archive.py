@@ -0,0 +1,256 @@
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import sys
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+import orjson
+from sqlalchemy import func, select
+
+from models import Event, FilePath, reset_storage_caches
+from event_serializer import row_to_json_dict
+
+EXPORT_FORMATS = {"ndjson", "csv"}
+CSV_COLUMNS = ["id", "event_type", "timestamp", "file_path", "git_hash", "git_message", "url", "title", "details"]
+# Imported rows are inserted in batches and committed in large transactions
+IMPORT_BATCH_SIZE = 5000
+IMPORT_COMMIT_ROWS = 50000
+# Imported timestamps further apart than this are looked up as separate ranges
+_DEDUP_GAP = timedelta(hours=1)
+
+def export_media_type(fmt: str) -> str:
+    """Content type of an export stream"""
+    return "application/x-ndjson" if fmt == "ndjson" else "application/gzip"
+
+def export_filename(fmt: str) -> str:
+    """Suggested file name for an export stream"""
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return f"events-{stamp}.ndjson" if fmt == "ndjson" else f"events-{stamp}.csv.gz"
+
+async def _export_ndjson(where, chunk_size: int) -> AsyncIterator[bytes]:
+    """Stream matching events as NDJSON, oldest first"""
+    async for rows in Event.stream_rows(where, chunk_size, ascending=True):
+        yield b"".join(orjson.dumps(row_to_json_dict(row)) + b"\n" for row in rows)
+
+async def _export_csv_gz(where, chunk_size: int) -> AsyncIterator[bytes]:
+    """Stream matching events as gzip-compressed CSV, oldest first"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip container
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    async for rows in Event.stream_rows(where, chunk_size, ascending=True):
+        for row in rows:
+            details = Event.details_json(row) or ""
+            writer.writerow([
+                row.id, row.event_type, row.timestamp.isoformat(), row.file_path, row.git_hash,
+                row.git_message, row.url, row.title,
+                details.decode("utf-8") if isinstance(details, bytes) else details
+            ])
+        data = compressor.compress(buffer.getvalue().encode("utf-8"))
+        buffer.seek(0)
+        buffer.truncate()
+        if data:
+            yield data
+    yield compressor.compress(buffer.getvalue().encode("utf-8")) + compressor.flush()
+
+def export_events(fmt: str = "ndjson", start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  event_types: Optional[List[str]] = None, chunk_size: int = 5000) -> AsyncIterator[bytes]:
+    """Stream events in [start, end) of the given types as NDJSON or gzipped CSV"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    where = Event._range_filter(start, end, event_types)
+    if fmt == "ndjson":
+        return _export_ndjson(where, chunk_size)
+    return _export_csv_gz(where, chunk_size)
+
+def _open_text(fileobj: BinaryIO) -> io.TextIOWrapper:
+    """Wrap a binary stream as text, transparently decompressing gzip input"""
+    if not hasattr(fileobj, "peek"):
+        fileobj = io.BufferedReader(fileobj)
+    if fileobj.peek(2)[:2] == b"\x1f\x8b":
+        fileobj = gzip.GzipFile(fileobj=fileobj)
+    return io.TextIOWrapper(fileobj, encoding="utf-8", newline="")
+
+def _iter_records(text: io.TextIOWrapper, fmt: str) -> Iterator[Union[str, Dict[str, Any]]]:
+    """Yield undecoded records (NDJSON lines or CSV rows) from an export stream"""
+    if fmt == "ndjson":
+        for line in text:
+            if line.strip():
+                yield line
+    else:
+        yield from csv.DictReader(text)
+
+def _record_to_row(record: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Decode an exported record into insertable columns (ids are reassigned)"""
+    if isinstance(record, str):
+        record = orjson.loads(record)
+    elif isinstance(record.get("details"), str):
+        record["details"] = orjson.loads(record["details"]) if record["details"] else None
+    if not isinstance(record, dict):
+        raise ValueError("record must be a JSON object")
+    event_type = record.get("event_type")
+    if not event_type:
+        raise ValueError("event_type is required")
+    timestamp = record.get("timestamp")
+    return {
+        "event_type": event_type,
+        "timestamp": datetime.fromisoformat(timestamp) if timestamp else datetime.now(),
+        "file_path": record.get("file_path") or None,
+        "git_hash": record.get("git_hash") or None,
+        "git_message": record.get("git_message") or None,
+        "url": record.get("url") or None,
+        "title": record.get("title") or None,
+        "details": record.get("details") or {}
+    }
+
+EventKey = Tuple[Any, ...]
+
+def _event_key(event_type, timestamp, file_path, git_hash, url, title) -> EventKey:
+    """What identifies an event across an export and re-import (ids are not kept)"""
+    return (event_type, timestamp, file_path or None, git_hash or None, url or None, title or None)
+
+def _row_key(row: Dict[str, Any]) -> EventKey:
+    return _event_key(row["event_type"], row["timestamp"], row["file_path"], row["git_hash"], row["url"], row["title"])
+
+async def _existing_keys(session, rows: List[Dict[str, Any]], high_water_mark: int) -> Counter:
+    """Count events already stored before the import began that match keys in rows"""
+    existing = Counter()
+    timestamps = sorted({row["timestamp"] for row in rows})
+    # Exports are in time order, so a batch usually spans one short range
+    ranges = [[timestamps[0], timestamps[0]]] if timestamps else []
+    for timestamp in timestamps[1:]:
+        if timestamp - ranges[-1][1] > _DEDUP_GAP:
+            ranges.append([timestamp, timestamp])
+        else:
+            ranges[-1][1] = timestamp
+    for start, end in ranges:
+        # Widened by a second: CURRENT_TIMESTAMP defaults are stored without microseconds
+        result = await session.execute(
+            select(
+                Event.event_type, Event.timestamp, func.coalesce(FilePath.path, Event.file_path),
+                Event.git_hash, Event.url, Event.title
+            )
+            .select_from(Event)
+            .outerjoin(FilePath, FilePath.id == Event.path_id)
+            .where(
+                Event.id <= high_water_mark,
+                Event.timestamp >= start - timedelta(seconds=1),
+                Event.timestamp <= end + timedelta(seconds=1)
+            )
+        )
+        existing.update(_event_key(*row) for row in result.all())
+    return existing
+
+async def _insert_new(session, rows: List[Dict[str, Any]], high_water_mark: int, seen: Counter) -> Tuple[int, int]:
+    """Insert rows, skipping as many copies of each event as were stored before the import.
+
+    Returns (inserted, duplicates). `seen` counts copies met so far in the
+    import; keys older than this batch (less the 1s widening) are dropped, as
+    exports are in time order, so it stays about one batch in size.
+    """
+    cutoff = min(row["timestamp"] for row in rows) - timedelta(seconds=1)
+    for key in [key for key in seen if key[1] < cutoff]:
+        del seen[key]
+
+    existing = await _existing_keys(session, rows, high_water_mark)
+    new = []
+    for row in rows:
+        key = _row_key(row)
+        seen[key] += 1
+        if seen[key] > existing[key]:
+            new.append(row)
+    return await Event.insert_many(session, new), len(rows) - len(new)
+
+async def import_events(fileobj: BinaryIO, fmt: str = "ndjson", batch_size: int = IMPORT_BATCH_SIZE,
+                        commit_rows: int = IMPORT_COMMIT_ROWS) -> Dict[str, int]:
+    """Import an NDJSON or (optionally gzipped) CSV export with batched inserts"""
+    from database import AsyncSessionLocal
+
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+    # Another process (the ingestion daemon) may have cleared the tables since
+    reset_storage_caches()
+    # Only events stored before the import count as duplicates, so events
+    # repeated within the export itself are kept
+    high_water_mark = await Event.get_high_water_mark()
+    seen = Counter()
+    imported = 0
+    duplicates = 0
+    skipped = 0
+    uncommitted = 0
+    batch = []
+    async with AsyncSessionLocal() as session:
+        for record in _iter_records(_open_text(fileobj), fmt):
+            try:
+                batch.append(_record_to_row(record))
+            except (ValueError, TypeError, AttributeError):
+                skipped += 1
+                continue
+            if len(batch) >= batch_size:
+                inserted, repeated = await _insert_new(session, batch, high_water_mark, seen)
+                imported += inserted
+                duplicates += repeated
+                uncommitted += len(batch)
+                batch = []
+                if uncommitted >= commit_rows:
+                    await session.commit()
+                    uncommitted = 0
+        if batch:
+            inserted, repeated = await _insert_new(session, batch, high_water_mark, seen)
+            imported += inserted
+            duplicates += repeated
+        await session.commit()
+    return {"imported": imported, "duplicates": duplicates, "skipped": skipped}
+
+def _parse_datetime(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+async def _run_cli(args):
+    from database import engine, init_db
+
+    # SQL echo goes to stdout, which may be carrying the export
+    engine.echo = False
+    await init_db()
+    if args.command == "export":
+        out = open(args.output, "wb") if args.output else sys.stdout.buffer
+        try:
+            async for chunk in export_events(args.format, args.start, args.end, args.type):
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+    else:
+        if args.input == "-":
+            result = await import_events(sys.stdin.buffer, args.format)
+        else:
+            with open(args.input, "rb") as f:
+                result = await import_events(f, args.format)
+        print(f"Imported {result['imported']} events ({result['duplicates']} already present, "
+              f"{result['skipped']} unreadable)", file=sys.stderr)
+    await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import event history")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Stream events to a file or stdout")
+    export_parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="ndjson")
+    export_parser.add_argument("--start", type=_parse_datetime, help="ISO timestamp (inclusive)")
+    export_parser.add_argument("--end", type=_parse_datetime, help="ISO timestamp (exclusive)")
+    export_parser.add_argument("--type", action="append", help="Event type to include (repeatable)")
+    export_parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+
+    import_parser = subparsers.add_parser("import", help="Load events from an export")
+    import_parser.add_argument("input", help="Export file, or - for stdin")
+    import_parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="ndjson")
+
+    asyncio.run(_run_cli(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import orjson
+from typing import Any, AsyncIterator, Dict, Sequence
+from models import Event
+
+# Empty details are emitted as an object, matching the dict read path
+_EMPTY_DETAILS = orjson.Fragment(b"{}")
+
+def _details_fragment(raw) -> orjson.Fragment:
+    """Embed stored details JSON as-is instead of parsing and re-encoding it"""
+    if not raw or raw == "null":
+        return _EMPTY_DETAILS
+    return orjson.Fragment(raw)
+
+def row_to_json_dict(row) -> Dict[str, Any]:
+    """Build the JSON shape of an event row; orjson encodes the datetime natively"""
+    return {
+        "id": row.id,
+        "event_type": row.event_type,
+        "timestamp": row.timestamp,
+        "file_path": row.file_path,
+        "git_hash": row.git_hash,
+        "git_message": row.git_message,
+        "url": row.url,
+        "title": row.title,
+        "details": _details_fragment(Event.details_json(row))
+    }
+
+def encode_rows(rows: Sequence[Any]) -> bytes:
+    """Encode a chunk of event rows as comma-separated JSON objects (no brackets)"""
+    return orjson.dumps([row_to_json_dict(row) for row in rows])[1:-1]
+
+async def encode_events_stream(chunks: AsyncIterator[Sequence[Any]], key: str = "events") -> AsyncIterator[bytes]:
+    """Encode chunks of event rows as a streamed {"events": [...]} JSON document"""
+    yield b'{"' + key.encode() + b'":['
+    first = True
+    async for rows in chunks:
+        if not rows:
+            continue
+        body = encode_rows(rows)
+        yield body if first else b"," + body
+        first = False
+    yield b"]}"
@@ -0,0 +1,242 @@
+import asyncio
+import os
+import struct
+import zlib
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Tuple
+
+import orjson
+from sqlalchemy.exc import OperationalError
+
+from models import Event, utc_now
+
+# Append-only file that events are written to while the database is unavailable,
+# replayed in order once the database accepts writes again
+SPOOL_PATH = os.getenv("SPOOL_PATH", "./whatido_spool.log")
+SPOOL_FSYNC_SECONDS = float(os.getenv("SPOOL_FSYNC_SECONDS", "0.2"))
+SPOOL_RETRY_SECONDS = float(os.getenv("SPOOL_RETRY_SECONDS", "2"))
+SPOOL_REPLAY_BATCH = 1000
+
+# Each record is <payload length, crc32 of payload> followed by the JSON payload
+_HEADER = struct.Struct("<II")
+
+class EventSpool:
+    def __init__(self, path: str = SPOOL_PATH):
+        self.path = path
+        self.offset_path = path + ".offset"
+        # Records the database rejected for good, kept as NDJSON for inspection
+        self.rejected_path = path + ".rejected"
+        self.file = None
+        self.size = 0  # bytes written
+        self.offset = 0  # bytes already replayed into the database
+        self.unsynced = False
+        self.task = None
+
+    @property
+    def pending(self) -> bool:
+        """Whether spooled events are waiting; new events queue behind them to keep order"""
+        return self.offset < self.size
+
+    def open(self):
+        """Open the spool file and recover the replay position"""
+        if self.file:
+            return
+        self.file = open(self.path, "ab", buffering=0)
+        self.size = os.fstat(self.file.fileno()).st_size
+        try:
+            with open(self.offset_path) as f:
+                self.offset = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            self.offset = 0
+        if self.offset > self.size:
+            self.offset = 0
+        # A crash mid-append leaves a torn record; drop it before anything is appended after it
+        end = self._valid_end()
+        if end < self.size:
+            self._truncate(end)
+        if self.pending:
+            print(f"Event spool has {self.size - self.offset} bytes waiting for replay")
+
+    def append(self, row: Dict[str, Any]):
+        """Append one event row; durability comes from the batched fsync"""
+        self.append_many([row])
+
+    def append_many(self, rows: List[Dict[str, Any]]):
+        """Append event rows in one write"""
+        self.open()
+        data = b"".join(self._encode(row) for row in rows)
+        try:
+            self.file.write(data)
+        except OSError:
+            # Never leave a partial record in front of later appends
+            self.file.truncate(self.size)
+            raise
+        self.size += len(data)
+        self.unsynced = True
+
+    @staticmethod
+    def _encode(row: Dict[str, Any]) -> bytes:
+        row = dict(row)
+        row.setdefault("timestamp", utc_now())
+        payload = orjson.dumps(row)
+        return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+    @staticmethod
+    def _decode(payload: bytes) -> Dict[str, Any]:
+        row = orjson.loads(payload)
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+        return row
+
+    def _records(self) -> Iterator[Tuple[bytes, int]]:
+        """Yield (payload, end offset) for intact records after the replay position"""
+        offset = self.offset
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            while offset < self.size:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return
+                length, checksum = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    return
+                offset += _HEADER.size + length
+                yield payload, offset
+
+    def _valid_end(self) -> int:
+        """Offset just past the last intact record"""
+        end = self.offset
+        for _, end in self._records():
+            pass
+        return end
+
+    def _read_batch(self, limit: int) -> Tuple[List[Tuple[bytes, int]], bool]:
+        """Read records after the replay position: ([(payload, end offset)], torn record found)"""
+        records = list(islice(self._records(), limit))
+        end = records[-1][1] if records else self.offset
+        return records, len(records) < limit and end < self.size
+
+    def _truncate(self, end: int):
+        print(f"Event spool: skipping torn record, dropping {self.size - end} trailing bytes")
+        self.file.truncate(end)
+        self.size = end
+
+    def _reject(self, payload: bytes, error: Exception):
+        """Set aside a record the database will never accept, so it does not block later ones"""
+        print(f"Event spool: rejected record moved to {self.rejected_path}: {error}")
+        with open(self.rejected_path, "ab") as f:
+            f.write(payload + b"\n")
+
+    def _save_offset(self):
+        tmp_path = self.offset_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(self.offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.offset_path)
+
+    def _reset(self):
+        """Empty the spool once everything in it is in the database"""
+        self.file.truncate(0)
+        self.size = 0
+        self.offset = 0
+        self.unsynced = False
+        try:
+            os.remove(self.offset_path)
+        except FileNotFoundError:
+            pass
+
+    async def _replay_each(self, records: List[Tuple[bytes, int]]) -> int:
+        """Insert records one at a time, setting aside those that fail with a data error"""
+        replayed = 0
+        for payload, end in records:
+            try:
+                await Event.create_many([self._decode(payload)])
+                replayed += 1
+            except OperationalError:
+                raise
+            except Exception as e:
+                self._reject(payload, e)
+            if end > self.size:
+                break  # cleared while inserting
+            self.offset = end
+            self._save_offset()
+        return replayed
+
+    async def replay(self):
+        """Insert spooled events in order; raises if the database is still unavailable"""
+        self.open()
+        replayed = 0
+        while self.pending:
+            records, torn = self._read_batch(SPOOL_REPLAY_BATCH)
+            if records:
+                end = records[-1][1]
+                try:
+                    await Event.create_many([self._decode(payload) for payload, _ in records])
+                    replayed += len(records)
+                except OperationalError:
+                    raise
+                except Exception as e:
+                    print(f"Event spool: batch rejected ({e}), replaying records one at a time")
+                    replayed += await self._replay_each(records)
+                if end > self.size:
+                    break  # cleared while inserting
+                self.offset = end
+                self._save_offset()
+            if torn:
+                self._truncate(self.offset)
+        # No await between the check and the truncate, so no append can slip in
+        if self.size and not self.pending:
+            self._reset()
+        if replayed:
+            print(f"Replayed {replayed} spooled events")
+
+    async def _sync(self):
+        if self.unsynced and self.file:
+            self.unsynced = False
+            await asyncio.to_thread(os.fsync, self.file.fileno())
+
+    async def _run(self):
+        """Batch fsyncs, and retry replay until the database recovers"""
+        last_attempt = 0.0
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(SPOOL_FSYNC_SECONDS)
+            try:
+                await self._sync()
+            except OSError as e:
+                print(f"Error syncing event spool: {e}")
+            if self.pending and loop.time() - last_attempt >= SPOOL_RETRY_SECONDS:
+                last_attempt = loop.time()
+                try:
+                    await self.replay()
+                except Exception as e:
+                    print(f"Event spool replay deferred: {e}")
+
+    def start(self):
+        """Open the spool and start the background sync/replay task"""
+        self.open()
+        if not self.task:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task and sync what was written"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.file:
+            await self._sync()
+            self.file.close()
+            self.file = None
+
+    def clear(self):
+        """Discard spooled events (when the database is cleared)"""
+        self.open()
+        self._reset()
+
+spool = EventSpool()
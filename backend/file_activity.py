@@ -0,0 +1,364 @@
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import aliased
+
+from models import (
+    Event, FilePath, FileActivity, FileActivityDay, FileCommit, IndexCursor,
+    utc_now, _SQL_CHUNK
+)
+
+# How often new events are folded into the per-file activity index
+ACTIVITY_INDEX_SECONDS = float(os.getenv("ACTIVITY_INDEX_SECONDS", "5"))
+ACTIVITY_INDEX_BATCH = int(os.getenv("ACTIVITY_INDEX_BATCH", "5000"))
+# Edits of a file less than this far apart count as continuous work on it
+ACTIVITY_IDLE_SECONDS = float(os.getenv("ACTIVITY_IDLE_SECONDS", "300"))
+# Time credited for an edit that starts a new session on a file
+ACTIVITY_EDIT_SECONDS = float(os.getenv("ACTIVITY_EDIT_SECONDS", "60"))
+
+CURSOR_NAME = "file_activity"
+EDIT_TYPES = {"file_created", "file_modified", "file_renamed"}
+INDEXED_TYPES = EDIT_TYPES | {"file_deleted", "git_commit"}
+HOT_SORT_FIELDS = {"active_seconds", "edits", "commits", "last_touched"}
+COUNTERS = ("edits", "active_seconds", "commits", "insertions", "deletions")
+
+RepoRoot = aliased(FilePath)
+
+def _latest(column, new):
+    """max() that ignores NULLs (SQLite's scalar max returns NULL if either is)"""
+    return func.max(func.coalesce(column, new), func.coalesce(new, column))
+
+def _earliest(column, new):
+    return func.min(func.coalesce(column, new), func.coalesce(new, column))
+
+def _upsert(model, keys: List[str], extra_set: Dict[str, Any]):
+    """INSERT that adds counters onto an existing row instead of failing"""
+    stmt = sqlite_insert(model)
+    set_ = {name: getattr(model, name) + getattr(stmt.excluded, name) for name in COUNTERS}
+    set_["repo_id"] = func.coalesce(stmt.excluded.repo_id, model.repo_id)
+    set_["last_touched"] = _latest(model.last_touched, stmt.excluded.last_touched)
+    for name, combine in extra_set.items():
+        set_[name] = combine(getattr(model, name), getattr(stmt.excluded, name))
+    return stmt.on_conflict_do_update(index_elements=keys, set_=set_)
+
+def _new_totals(repo_id: Optional[int]) -> Dict[str, Any]:
+    return {"repo_id": repo_id, "edits": 0, "active_seconds": 0.0, "commits": 0, "insertions": 0, "deletions": 0,
+            "last_touched": None}
+
+def _touch(totals: Dict[str, Any], timestamp: datetime):
+    if totals["last_touched"] is None or timestamp > totals["last_touched"]:
+        totals["last_touched"] = timestamp
+
+class ActivityBatch:
+    """Accumulates per-file and per-day deltas for one batch of events"""
+
+    def __init__(self, last_edits: Dict[int, datetime]):
+        self.last_edits = last_edits
+        self.files: Dict[int, Dict[str, Any]] = {}
+        self.days: Dict[Tuple[int, date], Dict[str, Any]] = {}
+        self.commits: List[Dict[str, Any]] = []
+
+    def _totals(self, path_id: int, repo_id: Optional[int], timestamp: datetime):
+        totals = self.files.get(path_id)
+        if totals is None:
+            totals = self.files[path_id] = {**_new_totals(repo_id), "first_touched": timestamp, "last_edit": None}
+        day = self.days.get((path_id, timestamp.date()))
+        if day is None:
+            day = self.days[(path_id, timestamp.date())] = _new_totals(repo_id)
+        if timestamp < totals["first_touched"]:
+            totals["first_touched"] = timestamp
+        _touch(totals, timestamp)
+        _touch(day, timestamp)
+        return totals, day
+
+    def edit(self, path_id: int, repo_id: Optional[int], timestamp: datetime, catch_up: bool):
+        """Count an edit and the active time since the previous one"""
+        totals, day = self._totals(path_id, repo_id, timestamp)
+        last = self.last_edits.get(path_id)
+        if catch_up:
+            active = 0.0  # Found by a scan, so when it happened is unknown
+        elif last is not None and timedelta(0) <= timestamp - last <= timedelta(seconds=ACTIVITY_IDLE_SECONDS):
+            active = (timestamp - last).total_seconds()
+        else:
+            active = ACTIVITY_EDIT_SECONDS
+        if last is None or timestamp > last:
+            self.last_edits[path_id] = timestamp
+            totals["last_edit"] = timestamp
+        for entry in (totals, day):
+            entry["edits"] += 1
+            entry["active_seconds"] += active
+
+    def touch(self, path_id: int, repo_id: Optional[int], timestamp: datetime):
+        self._totals(path_id, repo_id, timestamp)
+
+    def commit(self, path_id: int, repo_id: Optional[int], timestamp: datetime, event_id: int,
+               git_hash: str, insertions: int, deletions: int):
+        totals, day = self._totals(path_id, repo_id, timestamp)
+        for entry in (totals, day):
+            entry["commits"] += 1
+            entry["insertions"] += insertions
+            entry["deletions"] += deletions
+        self.commits.append({
+            "path_id": path_id, "git_hash": git_hash, "event_id": event_id, "timestamp": timestamp,
+            "insertions": insertions, "deletions": deletions
+        })
+
+async def _select_in(session, query, column, values: List[Any]) -> List[Any]:
+    """Run `query` filtered to column IN values, in chunks"""
+    rows = []
+    for i in range(0, len(values), _SQL_CHUNK):
+        result = await session.execute(query.where(column.in_(values[i:i + _SQL_CHUNK])))
+        rows.extend(result.all())
+    return rows
+
+async def _apply(session, rows):
+    """Fold a batch of event rows (in id order) into the index tables"""
+    changes = []  # (row, kind, absolute path, catch-up flag or commit file stats)
+    for row in rows:
+        details = orjson.loads(Event.details_json(row) or b"{}") or {}
+        if row.event_type == "git_commit":
+            if not row.repo_path or not row.git_hash:
+                continue  # Paths in commit details are relative to the repository
+            for changed in details.get("files") or []:
+                changes.append((row, "commit", os.path.join(row.repo_path, changed["path"]), changed))
+        elif row.file_path:
+            kind = "edit" if row.event_type in EDIT_TYPES else "touch"
+            changes.append((row, kind, row.file_path, bool(details.get("catch_up"))))
+    if not changes:
+        return
+
+    file_paths = {path for _, _, path, _ in changes}
+    path_ids = await FilePath.intern(session, file_paths | {row.repo_path for row, _, _, _ in changes if row.repo_path})
+    ids = sorted(path_ids[path] for path in file_paths)
+    last_edits = dict(await _select_in(
+        session, select(FileActivity.path_id, FileActivity.last_edit).where(FileActivity.last_edit.isnot(None)),
+        FileActivity.path_id, ids
+    ))
+    hashes = sorted({row.git_hash for row, kind, _, _ in changes if kind == "commit"})
+    linked = set(map(tuple, await _select_in(session, select(FileCommit.path_id, FileCommit.git_hash), FileCommit.git_hash, hashes)))
+
+    batch = ActivityBatch(last_edits)
+    for row, kind, path, extra in changes:
+        path_id = path_ids[path]
+        repo_id = path_ids[row.repo_path] if row.repo_path else None
+        if kind == "edit":
+            batch.edit(path_id, repo_id, row.timestamp, extra)
+        elif kind == "touch":
+            batch.touch(path_id, repo_id, row.timestamp)
+        elif (path_id, row.git_hash) not in linked:
+            # A commit is linked once even if recorded twice (e.g. live and by a backfill)
+            linked.add((path_id, row.git_hash))
+            batch.commit(path_id, repo_id, row.timestamp, row.id, row.git_hash,
+                         extra.get("insertions", 0), extra.get("deletions", 0))
+
+    if not batch.files:
+        return
+    await session.execute(
+        _upsert(FileActivity, ["path_id"], {"first_touched": _earliest, "last_edit": _latest}),
+        [{"path_id": path_id, **totals} for path_id, totals in batch.files.items()]
+    )
+    await session.execute(
+        _upsert(FileActivityDay, ["path_id", "day"], {}),
+        [{"path_id": path_id, "day": day, **totals} for (path_id, day), totals in batch.days.items()]
+    )
+    if batch.commits:
+        await session.execute(
+            sqlite_insert(FileCommit).on_conflict_do_nothing(index_elements=["path_id", "git_hash"]),
+            batch.commits
+        )
+
+async def get_cursor() -> int:
+    """Newest event id folded into the index"""
+    from database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(IndexCursor.high_water_mark).where(IndexCursor.name == CURSOR_NAME))
+        return result.scalar() or 0
+
+class ActivityIndexer:
+    """Keeps the per-file activity tables up to date with new events.
+
+    Events are processed in id order from a stored cursor, and each batch is
+    committed together with the cursor, so every event is counted once.
+    """
+
+    def __init__(self, batch_size: int = ACTIVITY_INDEX_BATCH):
+        self.batch_size = batch_size
+        self.task = None
+        # Held while indexing, so clearing events cannot interleave with a batch
+        self.lock = asyncio.Lock()
+
+    def start(self):
+        """Start the background indexing loop"""
+        if not self.task:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background loop; committed batches are kept"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _index_batch(self, cursor: int, high_water_mark: int) -> int:
+        """Index events after cursor up to high_water_mark; returns the new cursor"""
+        from database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                Event._row_select()
+                .add_columns(RepoRoot.path.label("repo_path"))
+                .outerjoin(RepoRoot, RepoRoot.id == Event.repo_id)
+                .where(Event.id > cursor, Event.id <= high_water_mark, Event.event_type.in_(INDEXED_TYPES))
+                .order_by(Event.id)
+                .limit(self.batch_size)
+            )
+            rows = result.all()
+            # A short batch means nothing else up to the high-water mark is indexed
+            new_cursor = rows[-1].id if len(rows) == self.batch_size else high_water_mark
+            await _apply(session, rows)
+            await session.execute(
+                sqlite_insert(IndexCursor)
+                .values(name=CURSOR_NAME, high_water_mark=new_cursor)
+                .on_conflict_do_update(index_elements=["name"], set_={"high_water_mark": new_cursor})
+            )
+            await session.commit()
+        return new_cursor
+
+    async def catch_up(self) -> int:
+        """Index every event recorded so far; returns how many ids were covered"""
+        async with self.lock:
+            high_water_mark = await Event.get_high_water_mark()
+            start = cursor = await get_cursor()
+            while cursor < high_water_mark:
+                cursor = await self._index_batch(cursor, high_water_mark)
+            return cursor - start
+
+    async def _run(self):
+        while True:
+            try:
+                covered = await self.catch_up()
+                if covered > self.batch_size:
+                    print(f"Indexed file activity for {covered} events")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error indexing file activity: {e}")
+            await asyncio.sleep(ACTIVITY_INDEX_SECONDS)
+
+def _file_to_dict(path: str, row) -> Dict[str, Any]:
+    return {
+        "path": path,
+        "edits": row.edits,
+        "active_seconds": round(row.active_seconds, 1),
+        "commits": row.commits,
+        "insertions": row.insertions,
+        "deletions": row.deletions,
+        "last_touched": row.last_touched.isoformat() if row.last_touched else None
+    }
+
+async def get_hot_files(days: Optional[int] = None, sort: str = "active_seconds", limit: int = 20,
+                        repo_path: Optional[str] = None) -> Dict[str, Any]:
+    """Top files by a metric, all time or over the last N UTC days"""
+    from database import AsyncSessionLocal
+
+    if sort not in HOT_SORT_FIELDS:
+        raise ValueError(f"sort must be one of: {', '.join(sorted(HOT_SORT_FIELDS))}")
+    if days is not None and days < 1:
+        raise ValueError("days must be at least 1")
+    limit = max(1, min(limit, 500))
+
+    columns = (*COUNTERS, "last_touched")
+    if days is None:
+        # Totals are materialised and indexed per metric
+        source = FileActivity
+        ranked = select(FileActivity.path_id, *(getattr(FileActivity, name) for name in columns))
+    else:
+        # Only rows for the window are read, however many events they summarise
+        source = FileActivityDay
+        ranked = (
+            select(
+                FileActivityDay.path_id,
+                *(func.sum(getattr(FileActivityDay, name)).label(name) for name in COUNTERS),
+                func.max(FileActivityDay.last_touched).label("last_touched")
+            )
+            .where(FileActivityDay.day >= utc_now().date() - timedelta(days=days - 1))
+            # "+ 0" stops SQLite from walking the whole (path_id, day) key to
+            # avoid sorting groups, so it range-scans the day index instead
+            .group_by(FileActivityDay.path_id + 0)
+        )
+    if repo_path:
+        ranked = ranked.where(source.repo_id == select(FilePath.id).where(FilePath.path == repo_path).scalar_subquery())
+    # Rank on ids alone and look up paths for the top rows only
+    ranked = ranked.order_by(ranked.selected_columns[sort].desc(), source.path_id).limit(limit).subquery()
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(FilePath.path, *(ranked.c[name] for name in columns))
+            .join(ranked, ranked.c.path_id == FilePath.id)
+            .order_by(ranked.c[sort].desc(), ranked.c.path_id)
+        )
+        files = [_file_to_dict(row.path, row) for row in result.all()]
+    return {"days": days, "sort": sort, "files": files, "indexed_through": await get_cursor()}
+
+async def get_file_history(path: str, days: int = 30, commit_limit: int = 50) -> Optional[Dict[str, Any]]:
+    """Totals, daily activity and linked commits for one file (None if it has none)"""
+    from database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(FileActivity)
+            .join(FilePath, FilePath.id == FileActivity.path_id)
+            .where(FilePath.path == path)
+        )
+        totals = result.scalar_one_or_none()
+        if totals is None:
+            return None
+
+        result = await session.execute(
+            select(FileActivityDay)
+            .where(FileActivityDay.path_id == totals.path_id,
+                   FileActivityDay.day >= utc_now().date() - timedelta(days=max(days, 1) - 1))
+            .order_by(FileActivityDay.day)
+        )
+        daily = [
+            {
+                "day": day.day.isoformat(),
+                **{name: round(getattr(day, name), 1) if name == "active_seconds" else getattr(day, name) for name in COUNTERS}
+            }
+            for day in result.scalars()
+        ]
+
+        result = await session.execute(
+            select(FileCommit, Event.git_message)
+            .join(Event, Event.id == FileCommit.event_id)
+            .where(FileCommit.path_id == totals.path_id)
+            .order_by(FileCommit.timestamp.desc())
+            .limit(commit_limit)
+        )
+        commits = [
+            {
+                "git_hash": link.git_hash,
+                "git_message": message,
+                "timestamp": link.timestamp.isoformat(),
+                "insertions": link.insertions,
+                "deletions": link.deletions
+            }
+            for link, message in result.all()
+        ]
+
+    return {
+        **_file_to_dict(path, totals),
+        "first_touched": totals.first_touched.isoformat() if totals.first_touched else None,
+        "last_edit": totals.last_edit.isoformat() if totals.last_edit else None,
+        "days": daily,
+        "linked_commits": commits
+    }
@@ -4,17 +4,29 @@ import threading
 import time
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from sqlalchemy.exc import OperationalError
 from models import Event
-from typing import Dict, Any
+from event_spool import spool
+from fs_scan import scan_tree
+from snapshot_index import SnapshotIndex
+from polling_observer import ScandirPollingObserver
+from typing import Dict, Any, List, Optional, Tuple
+
+# How often live changes to the snapshot index are persisted
+SNAPSHOT_FLUSH_SECONDS = 5
+# Poll instead of relying on native notifications (needed on NFS/SMB/container mounts)
+FILE_TRACKER_POLLING = os.getenv("FILE_TRACKER_POLLING", "false").lower() in ("1", "true", "yes")
 
 class FileEventHandler(FileSystemEventHandler):
-    def __init__(self):
+    def __init__(self, snapshot: Optional[SnapshotIndex] = None, root: Optional[str] = None):
         self.ignored_dirs = {'.git', '__pycache__', 'node_modules', '.next', 'dist', 'build'}
         self.ignored_extensions = {'.pyc', '.pyo', '.pyd', '.so', '.dylib', '.dll', '.db', '.sqlite', '.sqlite3'}
-        self.ignored_patterns = {'whatido.db-journal', 'whatido.db-wal', 'whatido.db-shm'}
+        self.ignored_patterns = {'whatido.db-journal', 'whatido.db-wal', 'whatido.db-shm', 'whatido_spool.log', 'whatido_spool.log.offset', 'whatido_spool.log.rejected'}
         self.loop = None
         self.last_event_time = {}
         self.throttle_seconds = 1  # Throttle events to max 1 per second per file
+        self.snapshot = snapshot
+        self.root = root
     
     def set_event_loop(self, loop):
         """Set the event loop for async operations"""
@@ -43,21 +55,35 @@ class FileEventHandler(FileSystemEventHandler):
         
         return False
     
+    def _track(self, path: str):
+        """Keep the snapshot index current (before throttling, so it never lags)"""
+        if self.snapshot:
+            self.snapshot.record(path)
+    
+    def _untrack(self, path: str):
+        if self.snapshot:
+            self.snapshot.remove(path)
+    
     def on_created(self, event):
         if not event.is_directory and not self.should_ignore(event.src_path):
+            self._track(event.src_path)
             self._schedule_event("file_created", event.src_path)
     
     def on_modified(self, event):
         if not event.is_directory and not self.should_ignore(event.src_path):
+            self._track(event.src_path)
             self._schedule_event("file_modified", event.src_path)
     
     def on_deleted(self, event):
         if not event.is_directory and not self.should_ignore(event.src_path):
+            self._untrack(event.src_path)
             self._schedule_event("file_deleted", event.src_path)
     
     def on_moved(self, event):
         if not event.is_directory:
             if not self.should_ignore(event.src_path) and not self.should_ignore(event.dest_path):
+                self._untrack(event.src_path)
+                self._track(event.dest_path)
                 self._schedule_event("file_renamed", event.dest_path, {
                     "old_path": event.src_path,
                     "new_path": event.dest_path
@@ -85,16 +111,49 @@ class FileEventHandler(FileSystemEventHandler):
     async def _create_event(self, event_type: str, file_path: str, details: Dict[str, Any] = None):
         """Create file event in database"""
         try:
-            await Event.create_file_event(event_type, file_path, details)
-            print(f"Created file event: {event_type} for {file_path}")
+            if await Event.create_file_event(event_type, file_path, details, repo_path=self.root):
+                print(f"Created file event: {event_type} for {file_path}")
+            else:
+                print(f"Spooled file event: {event_type} for {file_path}")
         except Exception as e:
             print(f"Error creating file event: {e}")
+    
+    def schedule_catch_up(self, changes: List[Tuple[str, str]]):
+        """Schedule bulk creation of events for changes missed while not tracking"""
+        if not changes:
+            return
+        if self.loop:
+            asyncio.run_coroutine_threadsafe(self._create_catch_up_events(changes), self.loop)
+        else:
+            print(f"Event loop not set, cannot create {len(changes)} catch-up events")
+    
+    async def _create_catch_up_events(self, changes: List[Tuple[str, str]]):
+        """Create synthetic file events in bulk"""
+        rows = [
+            {"event_type": event_type, "file_path": file_path, "repo_path": self.root, "details": {"catch_up": True}}
+            for event_type, file_path in changes
+        ]
+        if spool.pending:
+            spool.append_many(rows)
+            return
+        try:
+            created = await Event.create_many(rows)
+            print(f"Created {created} catch-up file events")
+        except OperationalError as e:
+            print(f"Database write failed, spooling {len(rows)} catch-up file events: {e}")
+            spool.append_many(rows)
+        except Exception as e:
+            print(f"Error creating catch-up file events: {e}")
 
 class FileTracker:
-    def __init__(self, repo_path: str):
+    def __init__(self, repo_path: str, polling: Optional[bool] = None):
         self.repo_path = repo_path
+        self.polling = FILE_TRACKER_POLLING if polling is None else polling
         self.observer = None
-        self.event_handler = FileEventHandler()
+        self.snapshot = SnapshotIndex(repo_path)
+        self.event_handler = FileEventHandler(self.snapshot, repo_path)
+        self._stop_event = threading.Event()
+        self._snapshot_thread = None
     
     def start(self):
         """Start file tracking"""
@@ -108,14 +167,62 @@ class FileTracker:
         except RuntimeError:
             print("Warning: No event loop running, file events may not be created")
         
-        self.observer = Observer()
+        # Load the index before watching, so live updates are not overwritten by the load
+        self.snapshot.load()
+        
+        self.observer = ScandirPollingObserver() if self.polling else Observer()
         self.observer.schedule(self.event_handler, self.repo_path, recursive=True)
         self.observer.start()
-        print(f"Started file tracking for: {self.repo_path}")
+        
+        self._stop_event.clear()
+        self._snapshot_thread = threading.Thread(target=self._snapshot_loop, daemon=True)
+        self._snapshot_thread.start()
+        print(f"Started {'polling ' if self.polling else ''}file tracking for: {self.repo_path}")
+    
+    def _catch_up(self):
+        """Diff the snapshot index against the tree and replay changes made while not tracking"""
+        started = time.time()
+        # Copied before scanning: the observer is already live and may update the index meanwhile
+        previous = self.snapshot.begin_scan()
+        scanned = scan_tree(self.repo_path, self.event_handler.should_ignore, cancelled=self._stop_event.is_set)
+        if scanned is None:
+            self.snapshot.end_scan()
+            return
+        changes = self.snapshot.reconcile(previous, scanned)
+        elapsed = time.time() - started
+        if self.snapshot.has_baseline:
+            self.event_handler.schedule_catch_up(changes)
+            print(f"Catch-up scan of {len(scanned)} files found {len(changes)} changes in {elapsed:.2f}s")
+        else:
+            # First run: nothing to compare against, just record the baseline
+            print(f"Indexed {len(scanned)} files in {elapsed:.2f}s")
+        self._flush_snapshot(baseline=True)
+    
+    def _snapshot_loop(self):
+        """Run the catch-up scan, then persist index changes periodically"""
+        try:
+            self._catch_up()
+        except Exception as e:
+            self.snapshot.end_scan()
+            print(f"Error during catch-up scan: {e}")
+        while not self._stop_event.wait(SNAPSHOT_FLUSH_SECONDS):
+            self._flush_snapshot()
+    
+    def _flush_snapshot(self, baseline: bool = False):
+        try:
+            self.snapshot.flush(baseline)
+        except Exception as e:
+            print(f"Error saving file snapshot: {e}")
     
     def stop(self):
-        """Stop file tracking"""
+        """Stop file tracking (blocks until threads exit; cancels a running catch-up scan)"""
+        self._stop_event.set()
         if self.observer and self.observer.is_alive():
             self.observer.stop()
             self.observer.join()
             print("Stopped file tracking")
+        
+        if self._snapshot_thread:
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+        self._flush_snapshot()
@@ -0,0 +1,52 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional, Tuple
+
+# (size, mtime_ns, inode) of a file
+FileStat = Tuple[int, int, int]
+
+def default_workers() -> int:
+    """Thread count for directory walks; scandir/stat release the GIL"""
+    return min(32, (os.cpu_count() or 1) * 4)
+
+def scan_dir(path: str, should_ignore: Callable[[str], bool]) -> Tuple[Dict[str, FileStat], List[str]]:
+    """List one directory: stats of its files and the subdirectories to descend into"""
+    files = {}
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not should_ignore(entry.path):
+                            subdirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and not should_ignore(entry.path):
+                        st = entry.stat(follow_symlinks=False)
+                        files[entry.path] = (st.st_size, st.st_mtime_ns, st.st_ino)
+                except OSError:
+                    # Entry vanished or is unreadable mid-walk
+                    continue
+    except OSError:
+        pass
+    return files, subdirs
+
+def scan_tree(root: str, should_ignore: Callable[[str], bool], workers: Optional[int] = None,
+              cancelled: Optional[Callable[[], bool]] = None) -> Optional[Dict[str, FileStat]]:
+    """Walk a tree with one scandir task per directory spread over a thread pool.
+
+    Returns None if `cancelled` reports true before the walk finishes.
+    """
+    files = {}
+    with ThreadPoolExecutor(max_workers=workers or default_workers()) as pool:
+        pending = {pool.submit(scan_dir, root, should_ignore)}
+        while pending:
+            if cancelled and cancelled():
+                for future in pending:
+                    future.cancel()
+                return None
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                dir_files, subdirs = future.result()
+                files.update(dir_files)
+                pending.update(pool.submit(scan_dir, subdir, should_ignore) for subdir in subdirs)
+    return files
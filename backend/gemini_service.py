@@ -62,11 +62,9 @@ class GeminiService:
         Keep it concise but insightful, like a personal productivity coach.
         """
         
-        try:
-            response = self.model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            return f"Error generating report: {str(e)}"
+        # Errors propagate so a failed call is never stored as a report
+        response = await self.model.generate_content_async(prompt)
+        return response.text
     
     async def generate_suggestions(self, events: List[Dict[str, Any]]) -> List[str]:
         """Generate smart suggestions based on activity"""
@@ -85,12 +83,10 @@ class GeminiService:
         Be specific and actionable.
         """
         
-        try:
-            response = self.model.generate_content(prompt)
-            suggestions = [line.strip("- ").strip() for line in response.text.split("\n") if line.strip().startswith("-")]
-            return suggestions[:5]  # Limit to 5 suggestions
-        except Exception as e:
-            return [f"Error generating suggestions: {str(e)}"]
+        # Errors propagate so a failed call is never stored as suggestions
+        response = await self.model.generate_content_async(prompt)
+        suggestions = [line.strip("- ").strip() for line in response.text.split("\n") if line.strip().startswith("-")]
+        return suggestions[:5]  # Limit to 5 suggestions
     
     async def answer_question(self, question: str, events: List[Dict[str, Any]]) -> str:
         """Answer a natural language question about recent activity"""
@@ -106,7 +102,7 @@ class GeminiService:
         """
         
         try:
-            response = self.model.generate_content(prompt)
+            response = await self.model.generate_content_async(prompt)
             return response.text
         except Exception as e:
             return f"Error answering question: {str(e)}"
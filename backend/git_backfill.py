@@ -0,0 +1,186 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from models import Event
+
+# Days of history imported when git tracking starts (0 disables backfill)
+GIT_BACKFILL_DAYS = int(os.getenv("GIT_BACKFILL_DAYS", "0"))
+# Commits per insert transaction; each committed batch survives an interrupted run
+GIT_BACKFILL_BATCH = int(os.getenv("GIT_BACKFILL_BATCH", "2000"))
+
+# One record per commit: hash, author, email, ISO date and message, then
+# the --numstat entries. -z keeps paths unquoted and NUL-terminated.
+LOG_FORMAT = "%x1e%H%x00%an%x00%ae%x00%cI%x00%B"
+READ_CHUNK = 256 * 1024
+
+def parse_commit(record: bytes) -> Optional[Dict[str, Any]]:
+    """Parse one `git log -z --numstat` record into commit fields and file stats"""
+    parts = record.split(b"\0")
+    if len(parts) < 5:
+        return None
+    git_hash, author, email, date, message = (part.decode("utf-8", "replace") for part in parts[:5])
+
+    files = []
+    for entry in parts[5:]:
+        entry = entry.lstrip(b"\n")
+        if not entry:
+            continue
+        insertions, deletions, path = entry.decode("utf-8", "replace").split("\t", 2)
+        # Binary files report "-" for both counts
+        insertions = int(insertions) if insertions != "-" else 0
+        deletions = int(deletions) if deletions != "-" else 0
+        files.append({
+            "path": path,
+            "insertions": insertions,
+            "deletions": deletions,
+            "lines": insertions + deletions
+        })
+
+    return {
+        "hash": git_hash,
+        "message": message.strip(),
+        # Same shape as GitTracker._commit_details
+        "details": {
+            "author": author,
+            "email": email,
+            "date": date,
+            "files_changed": len(files),
+            "files": files
+        }
+    }
+
+async def _git(repo_path: str, *args: str) -> bytes:
+    proc = await asyncio.create_subprocess_exec(
+        "git", "-C", repo_path, *args,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"git {args[0]} failed: {stderr.decode(errors='replace').strip()}")
+    return stdout
+
+async def stream_commits(repo_path: str, since: str) -> AsyncIterator[Dict[str, Any]]:
+    """Yield commits on HEAD newer than `since`, newest first, from one git log process"""
+    proc = await asyncio.create_subprocess_exec(
+        "git", "-C", repo_path, "log", "-z", "--numstat", "--no-renames",
+        f"--format={LOG_FORMAT}", f"--since={since}", "HEAD",
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        buffer = b""
+        while chunk := await proc.stdout.read(READ_CHUNK):
+            records = (buffer + chunk).split(b"\x1e")
+            # The last record may continue in the next chunk
+            buffer = records.pop()
+            for record in records:
+                commit = parse_commit(record)
+                if commit:
+                    yield commit
+        commit = parse_commit(buffer)
+        if commit:
+            yield commit
+
+        stderr = await proc.stderr.read()
+        if await proc.wait() != 0:
+            raise RuntimeError(f"git log failed: {stderr.decode(errors='replace').strip()}")
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+
+def _commit_timestamp(date: str) -> datetime:
+    """Commit date as naive UTC, like stored event timestamps"""
+    return datetime.fromisoformat(date).astimezone(timezone.utc).replace(tzinfo=None)
+
+class GitBackfill:
+    """Imports past commits of a repository as git_commit events in the background.
+
+    Commits already recorded for the repository are skipped, so an
+    interrupted backfill resumes where it stopped when started again.
+    """
+
+    def __init__(self, repo_path: str, days: int, batch_size: int = GIT_BACKFILL_BATCH):
+        self.repo_path = repo_path
+        self.days = days
+        self.batch_size = batch_size
+        self.task = None
+        self.state = "pending"
+        self.total = None
+        self.imported = 0
+        self.skipped = 0
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+
+    def start(self):
+        """Start the backfill task"""
+        if not self.task:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the backfill; batches already inserted are kept"""
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    def progress(self) -> Dict[str, Any]:
+        """Current state and commit counts"""
+        done = self.imported + self.skipped
+        return {
+            "repo_path": self.repo_path,
+            "days": self.days,
+            "state": self.state,
+            "total": self.total,
+            "imported": self.imported,
+            "skipped": self.skipped,
+            "percent": round(100 * done / self.total, 1) if self.total else None,
+            "error": self.error,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    async def _insert(self, rows: List[Dict[str, Any]]):
+        self.imported += await Event.create_many(rows)
+        rows.clear()
+
+    async def _run(self):
+        since = f"{self.days} days ago"
+        self.state = "running"
+        self.started_at = datetime.now()
+        try:
+            # rev-list only walks the commit graph, so counting is cheap
+            self.total = int(await _git(self.repo_path, "rev-list", "--count", f"--since={since}", "HEAD"))
+            known = await Event.get_git_hashes(self.repo_path, "git_commit")
+
+            rows = []
+            async for commit in stream_commits(self.repo_path, since):
+                if commit["hash"] in known:
+                    self.skipped += 1
+                    continue
+                rows.append({
+                    "event_type": "git_commit",
+                    "timestamp": _commit_timestamp(commit["details"]["date"]),
+                    "repo_path": self.repo_path,
+                    "git_hash": commit["hash"],
+                    "git_message": commit["message"],
+                    "details": {**commit["details"], "backfill": True}
+                })
+                if len(rows) >= self.batch_size:
+                    await self._insert(rows)
+            await self._insert(rows)
+            self.state = "done"
+            print(f"Backfilled {self.imported} commits from {self.repo_path} ({self.skipped} already recorded)")
+        except asyncio.CancelledError:
+            self.state = "cancelled"
+            raise
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            print(f"Error backfilling Git history for {self.repo_path}: {e}")
+        finally:
+            self.finished_at = datetime.now()
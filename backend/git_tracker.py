@@ -34,6 +34,27 @@ class GitTracker:
         except Exception as e:
             print(f"Error updating Git state: {e}")
     
+    def _commit_details(self, commit) -> Dict[str, Any]:
+        """Build event details for a commit"""
+        # commit.stats runs a diff on every access, so read it once
+        stats = commit.stats
+        files_changed = []
+        for file_path, file_stats in stats.files.items():
+            files_changed.append({
+                "path": file_path,
+                "insertions": file_stats.get('insertions', 0),
+                "deletions": file_stats.get('deletions', 0),
+                "lines": file_stats.get('lines', 0)
+            })
+        
+        return {
+            "author": commit.author.name,
+            "email": commit.author.email,
+            "date": commit.committed_datetime.isoformat(),
+            "files_changed": len(stats.files),
+            "files": files_changed
+        }
+    
     async def _check_git_changes(self):
         """Check for Git changes and create events"""
         try:
@@ -43,27 +64,12 @@ class GitTracker:
                 if self.last_commit_hash and current_commit != self.last_commit_hash:
                     # New commit detected
                     commit = self.repo.head.commit
-                    # Get detailed file information
-                    files_changed = []
-                    for file_path, stats in commit.stats.files.items():
-                        files_changed.append({
-                            "path": file_path,
-                            "insertions": stats.get('insertions', 0),
-                            "deletions": stats.get('deletions', 0),
-                            "lines": stats.get('lines', 0)
-                        })
-                    
                     await Event.create_git_event(
                         "git_commit",
+                        repo_path=self.repo_path,
                         git_hash=commit.hexsha,
                         git_message=commit.message.strip(),
-                        details={
-                            "author": commit.author.name,
-                            "email": commit.author.email,
-                            "date": commit.committed_datetime.isoformat(),
-                            "files_changed": len(commit.stats.files),
-                            "files": files_changed
-                        }
+                        details=self._commit_details(commit)
                     )
                     self.last_commit_hash = current_commit
             
@@ -78,6 +84,7 @@ class GitTracker:
             for file_path in newly_staged:
                 await Event.create_git_event(
                     "git_add",
+                    repo_path=self.repo_path,
                     details={
                         "file_path": file_path,
                         "action": "staged"
@@ -89,6 +96,7 @@ class GitTracker:
             for file_path in unstaged:
                 await Event.create_git_event(
                     "git_unstage",
+                    repo_path=self.repo_path,
                     details={
                         "file_path": file_path,
                         "action": "unstaged"
@@ -118,25 +126,13 @@ class GitTracker:
                 
                 for commit_hash in newly_pushed:
                     commit = self.repo.commit(commit_hash)
-                    # Get detailed file information for pushed commit
-                    files_changed = []
-                    for file_path, stats in commit.stats.files.items():
-                        files_changed.append({
-                            "path": file_path,
-                            "insertions": stats.get('insertions', 0),
-                            "deletions": stats.get('deletions', 0),
-                            "lines": stats.get('lines', 0)
-                        })
-                    
+                    # Same payload as the commit event, so its details are stored once
                     await Event.create_git_event(
                         "git_push",
+                        repo_path=self.repo_path,
                         git_hash=commit_hash,
                         git_message=commit.message.strip(),
-                        details={
-                            "author": commit.author.name,
-                            "files_changed": len(commit.stats.files),
-                            "files": files_changed
-                        }
+                        details=self._commit_details(commit)
                     )
                 
                 self.last_pushed_commits.update(newly_pushed)
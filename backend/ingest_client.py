@@ -0,0 +1,77 @@
+import asyncio
+import os
+from typing import Any, Dict, Optional
+
+import orjson
+
+INGEST_SOCKET = os.getenv("INGEST_SOCKET", "./whatido_ingest.sock")
+# Requests and responses are single JSON lines; browser details can be large
+INGEST_LINE_LIMIT = 16 * 1024 * 1024
+
+class IngestError(Exception):
+    """The ingestion daemon is unreachable or rejected a command"""
+
+class IngestCommandError(IngestError):
+    """The ingestion daemon ran a command and it failed"""
+
+class IngestClient:
+    """Forwards tracker control and event writes to the ingestion daemon.
+
+    Has the same async interface as TrackerManager, so API workers can use
+    it in its place.
+    """
+
+    def __init__(self, socket_path: str = INGEST_SOCKET):
+        self.socket_path = socket_path
+
+    async def call(self, command: str, **args) -> Any:
+        """Send one command over the Unix socket and wait for its result"""
+        try:
+            reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=INGEST_LINE_LIMIT)
+        except OSError as e:
+            raise IngestError(f"Ingestion daemon unavailable at {self.socket_path}: {e}")
+        try:
+            writer.write(orjson.dumps({"command": command, "args": args}) + b"\n")
+            await writer.drain()
+            line = await reader.readline()
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+        if not line:
+            raise IngestError("Ingestion daemon closed the connection")
+        response = orjson.loads(line)
+        if not response.get("ok"):
+            raise IngestCommandError(response.get("error") or "Ingestion daemon command failed")
+        return response.get("result")
+
+    async def start(self):
+        """Nothing to start; the daemon owns the database and trackers"""
+
+    async def stop(self):
+        """Nothing to stop; trackers keep running in the daemon"""
+
+    async def start_file_tracking(self, path: str, polling: Optional[bool] = None):
+        return await self.call("start_file_tracking", path=path, polling=polling)
+
+    async def start_git_tracking(self, path: str, backfill_days: Optional[int] = None):
+        return await self.call("start_git_tracking", path=path, backfill_days=backfill_days)
+
+    async def add_browser_event(self, event_type: str, url: Optional[str] = None, title: Optional[str] = None,
+                                details: Optional[Dict[str, Any]] = None) -> Optional[int]:
+        return await self.call("add_browser_event", event_type=event_type, url=url, title=title, details=details)
+
+    async def clear_events(self):
+        return await self.call("clear_events")
+
+    async def import_events(self, path: str, fmt: str = "ndjson") -> Dict[str, int]:
+        return await self.call("import_events", path=path, fmt=fmt)
+
+    async def refresh_report(self, kind: str) -> Dict[str, Any]:
+        return await self.call("refresh_report", kind=kind)
+
+    async def revalidate_report(self, kind: str):
+        return await self.call("revalidate_report", kind=kind)
+
+    async def status(self) -> Dict[str, Any]:
+        return await self.call("status")
@@ -0,0 +1,68 @@
+import asyncio
+import os
+import signal
+
+import orjson
+from dotenv import load_dotenv
+
+from ingest_client import INGEST_SOCKET, INGEST_LINE_LIMIT
+from tracker_manager import TrackerManager
+
+# Commands API workers may forward; everything else is rejected
+INGEST_COMMANDS = {
+    "start_file_tracking", "start_git_tracking", "add_browser_event", "clear_events",
+    "import_events", "refresh_report", "revalidate_report", "status"
+}
+
+async def _handle_connection(manager: TrackerManager, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Serve newline-delimited JSON commands from one API worker connection"""
+    try:
+        while line := await reader.readline():
+            try:
+                request = orjson.loads(line)
+                command = request.get("command")
+                if command not in INGEST_COMMANDS:
+                    raise ValueError(f"Unknown command: {command}")
+                result = await getattr(manager, command)(**(request.get("args") or {}))
+                response = {"ok": True, "result": result}
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            writer.write(orjson.dumps(response) + b"\n")
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+        print(f"Ingestion connection error: {e}")
+    finally:
+        writer.close()
+
+async def serve(socket_path: str = INGEST_SOCKET):
+    """Run the trackers and accept commands from API workers until signalled"""
+    manager = TrackerManager()
+    await manager.start()
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)  # left over from a previous run
+    server = await asyncio.start_unix_server(
+        lambda reader, writer: _handle_connection(manager, reader, writer),
+        path=socket_path,
+        limit=INGEST_LINE_LIMIT
+    )
+    os.chmod(socket_path, 0o600)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    print(f"Ingestion daemon listening on {socket_path}")
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        await manager.stop()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        print("Ingestion daemon stopped")
+
+if __name__ == "__main__":
+    load_dotenv()
+    asyncio.run(serve())
@@ -1,36 +1,68 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from contextlib import asynccontextmanager
 import uvicorn
 import os
+import tempfile
+from datetime import datetime
+from typing import List, Optional
 from dotenv import load_dotenv
 
-from database import init_db
-from models import Event, RepoPath
-from file_tracker import FileTracker
-from git_tracker import GitTracker
+from models import Event
+from tracker_manager import TrackerManager
+from ingest_client import IngestClient, IngestCommandError, IngestError
 from gemini_service import GeminiService
+from event_serializer import encode_events_stream
+from timeline import get_timeline, cache as timeline_cache
+from file_activity import get_hot_files, get_file_history
+from report_scheduler import serve_report
+from event_archive import EXPORT_FORMATS, export_events as stream_export, export_filename, export_media_type
 
 # Load environment variables
 load_dotenv()
 
-# Global trackers
-file_tracker = None
-git_tracker = None
+# API_MODE=worker runs this process as one of several stateless API workers
+# (uvicorn --workers N); trackers and event writes then live in the ingestion
+# daemon (python ingest_daemon.py) and are reached over its Unix socket.
+API_MODE = os.getenv("API_MODE", "standalone")
+
+# Owner of the trackers: in-process, or a proxy to the ingestion daemon
+trackers = IngestClient() if API_MODE == "worker" else TrackerManager()
 gemini_service = None
 
+def _backfill_days(tracking_data: dict) -> Optional[int]:
+    """Validated `backfill_days` from a tracking request (None when not given)"""
+    value = tracking_data.get("backfill_days")
+    if value is None:
+        return None
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        days = int(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="backfill_days must be a non-negative integer")
+    if days < 0:
+        raise HTTPException(status_code=400, detail="backfill_days must be a non-negative integer")
+    return days
+
+def _polling(tracking_data: dict) -> Optional[bool]:
+    """Validated `polling` flag from a tracking request (None when not given)"""
+    value = tracking_data.get("polling")
+    # A string such as "false" would be truthy, so only JSON booleans are accepted
+    if value is not None and not isinstance(value, bool):
+        raise HTTPException(status_code=400, detail="polling must be true or false")
+    return value
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    await init_db()
+    await trackers.start()
     global gemini_service
     gemini_service = GeminiService()
     yield
     # Shutdown
-    if file_tracker:
-        file_tracker.stop()
-    if git_tracker:
-        git_tracker.stop()
+    await trackers.stop()
 
 app = FastAPI(
     title="What Did I Just Do?",
@@ -48,6 +80,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(IngestError)
+async def ingest_error_handler(request: Request, exc: IngestError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
 @app.get("/")
 async def root():
     return {"message": "What Did I Just Do? API is running!"}
@@ -55,8 +91,6 @@ async def root():
 @app.post("/select-repo")
 async def select_repo(repo_data: dict):
     """Select and start monitoring a repository (legacy endpoint)"""
-    global file_tracker, git_tracker
-    
     folder_name = repo_data.get("folder_name")
     if not folder_name:
         raise HTTPException(status_code=400, detail="folder_name is required")
@@ -72,32 +106,19 @@ async def select_repo(repo_data: dict):
     if not os.path.exists(git_dir):
         raise HTTPException(status_code=400, detail="Directory is not a Git repository")
     
-    # Stop existing trackers
-    if file_tracker:
-        file_tracker.stop()
-    if git_tracker:
-        git_tracker.stop()
-    
-    # Start new trackers
-    file_tracker = FileTracker(repo_path)
-    git_tracker = GitTracker(repo_path)
-    
-    file_tracker.start()
-    git_tracker.start()
-    
-    # Store repo path in database
-    await RepoPath.create_or_update(repo_path)
+    # Replace existing trackers
+    await trackers.start_file_tracking(repo_path)
+    await trackers.start_git_tracking(repo_path)
     
     return {"message": f"Started monitoring repository: {repo_path}"}
 
 @app.post("/start-local-tracking")
 async def start_local_tracking(tracking_data: dict):
     """Start tracking a local directory for file changes only"""
-    global file_tracker
-    
     local_directory_path = tracking_data.get("local_directory_path")
     if not local_directory_path:
         raise HTTPException(status_code=400, detail="local_directory_path is required")
+    polling = _polling(tracking_data)
     
     # Resolve to absolute path
     dir_path = os.path.abspath(local_directory_path)
@@ -109,27 +130,18 @@ async def start_local_tracking(tracking_data: dict):
     if not os.path.isdir(dir_path):
         raise HTTPException(status_code=400, detail="Path is not a directory")
     
-    # Stop existing file tracker
-    if file_tracker:
-        file_tracker.stop()
-    
-    # Start new file tracker
-    file_tracker = FileTracker(dir_path)
-    file_tracker.start()
-    
-    # Store directory path in database
-    await RepoPath.create_or_update(dir_path)
+    # Replace existing file tracker
+    await trackers.start_file_tracking(dir_path, polling)
     
     return {"message": f"Started tracking local directory: {dir_path}"}
 
 @app.post("/start-git-tracking")
 async def start_git_tracking(tracking_data: dict):
     """Start tracking a Git repository for commits and changes"""
-    global git_tracker
-    
     git_repo_path = tracking_data.get("git_repo_path")
     if not git_repo_path:
         raise HTTPException(status_code=400, detail="git_repo_path is required")
+    backfill_days = _backfill_days(tracking_data)
     
     # Resolve to absolute path
     repo_path = os.path.abspath(git_repo_path)
@@ -142,27 +154,20 @@ async def start_git_tracking(tracking_data: dict):
     if not os.path.exists(git_dir):
         raise HTTPException(status_code=400, detail="Directory is not a Git repository")
     
-    # Stop existing git tracker
-    if git_tracker:
-        git_tracker.stop()
-    
-    # Start new git tracker
-    git_tracker = GitTracker(repo_path)
-    git_tracker.start()
-    
-    # Store repo path in database
-    await RepoPath.create_or_update(repo_path)
+    # Replace existing git tracker
+    await trackers.start_git_tracking(repo_path, backfill_days)
     
     return {"message": f"Started tracking Git repository: {repo_path}"}
 
 @app.post("/start-tracking")
 async def start_tracking(tracking_data: dict):
     """Start tracking based on mode (local, git, or both)"""
-    global file_tracker, git_tracker
-    
     tracking_mode = tracking_data.get("tracking_mode", "local")
     local_directory_path = tracking_data.get("local_directory_path")
     git_repo_path = tracking_data.get("git_repo_path")
+    # Checked before any tracker is replaced
+    backfill_days = _backfill_days(tracking_data) if tracking_mode in ("git", "both") else None
+    polling = _polling(tracking_data) if tracking_mode in ("local", "both") else None
     
     if tracking_mode == "local":
         if not local_directory_path:
@@ -173,12 +178,7 @@ async def start_tracking(tracking_data: dict):
         if not os.path.exists(dir_path):
             raise HTTPException(status_code=404, detail="Local directory does not exist")
         
-        if file_tracker:
-            file_tracker.stop()
-        file_tracker = FileTracker(dir_path)
-        file_tracker.start()
-        
-        await RepoPath.create_or_update(dir_path)
+        await trackers.start_file_tracking(dir_path, polling)
         return {"message": f"Started local tracking: {dir_path}"}
     
     elif tracking_mode == "git":
@@ -194,12 +194,7 @@ async def start_tracking(tracking_data: dict):
         if not os.path.exists(git_dir):
             raise HTTPException(status_code=400, detail="Directory is not a Git repository")
         
-        if git_tracker:
-            git_tracker.stop()
-        git_tracker = GitTracker(repo_path)
-        git_tracker.start()
-        
-        await RepoPath.create_or_update(repo_path)
+        await trackers.start_git_tracking(repo_path, backfill_days)
         return {"message": f"Started git tracking: {repo_path}"}
     
     elif tracking_mode == "both":
@@ -219,53 +214,78 @@ async def start_tracking(tracking_data: dict):
         if not os.path.exists(git_dir):
             raise HTTPException(status_code=400, detail="Git repository path is not a valid Git repository")
         
-        # Stop existing trackers
-        if file_tracker:
-            file_tracker.stop()
-        if git_tracker:
-            git_tracker.stop()
-        
-        # Start new trackers
-        file_tracker = FileTracker(dir_path)
-        git_tracker = GitTracker(repo_path)
-        
-        file_tracker.start()
-        git_tracker.start()
-        
-        # Store both paths
-        await RepoPath.create_or_update(dir_path)
-        await RepoPath.create_or_update(repo_path)
+        # Replace existing trackers
+        await trackers.start_file_tracking(dir_path, polling)
+        await trackers.start_git_tracking(repo_path, backfill_days)
         
         return {"message": f"Started tracking both local directory: {dir_path} and git repository: {repo_path}"}
     
     else:
         raise HTTPException(status_code=400, detail="Invalid tracking_mode. Must be 'local', 'git', or 'both'")
 
+@app.get("/tracking-status")
+async def tracking_status():
+    """Get the paths currently being tracked"""
+    return await trackers.status()
+
 @app.get("/events")
 async def get_events(hours: int = 3):
-    """Get events from the last N hours"""
-    events = await Event.get_recent_events(hours)
-    return {"events": events}
+    """Get events from the last N hours, streamed as JSON straight from row tuples"""
+    return StreamingResponse(
+        encode_events_stream(Event.stream_recent_rows(hours)),
+        media_type="application/json"
+    )
+
+@app.get("/timeline")
+async def timeline(
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    bucket: str = "1h",
+    group_by: str = "event_type",
+    limit: int = 20
+):
+    """Get event counts per time bucket, grouped by event_type, file, repo or domain"""
+    try:
+        return await get_timeline(start, end, bucket, group_by, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/files/hot")
+async def hot_files(days: Optional[int] = None, sort: str = "active_seconds", limit: int = 20, repo: Optional[str] = None):
+    """Get the most active files, all time or over the last N days"""
+    try:
+        return await get_hot_files(days, sort, limit, repo)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/files/{path:path}/history")
+async def file_history(path: str, days: int = 30, commits: int = 50):
+    """Get edit, active-time and commit history for one file"""
+    # Paths are absolute; clients may drop the leading slash
+    if not os.path.isabs(path):
+        path = os.sep + path
+    history = await get_file_history(path, days, commits)
+    if history is None:
+        raise HTTPException(status_code=404, detail="No activity recorded for this file")
+    return history
 
 @app.get("/daily-report")
-async def get_daily_report():
-    """Get AI-generated daily productivity report"""
-    if not gemini_service:
-        raise HTTPException(status_code=500, detail="Gemini service not initialized")
-    
-    events = await Event.get_daily_events()
-    report = await gemini_service.generate_daily_report(events)
-    return {"report": report}
+async def get_daily_report(refresh: bool = False, stale_while_revalidate: bool = False):
+    """Get the latest precomputed AI daily productivity report"""
+    try:
+        report = await serve_report(trackers, "daily_report", refresh, stale_while_revalidate)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"report": report.pop("content"), **report}
 
 @app.get("/suggestions")
-async def get_suggestions():
-    """Get smart suggestions based on activity"""
-    if not gemini_service:
-        raise HTTPException(status_code=500, detail="Gemini service not initialized")
-    
-    events = await Event.get_recent_events(24)  # Last 24 hours
-    suggestions = await gemini_service.generate_suggestions(events)
-    return {"suggestions": suggestions}
+async def get_suggestions(refresh: bool = False, stale_while_revalidate: bool = False):
+    """Get the latest precomputed smart suggestions"""
+    try:
+        report = await serve_report(trackers, "suggestions", refresh, stale_while_revalidate)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"suggestions": report.pop("content"), **report}
 
 @app.post("/ask-gemini")
 async def ask_gemini(question_data: dict):
@@ -285,6 +305,8 @@ async def ask_gemini(question_data: dict):
 async def add_browser_event(event_data: dict):
     """Add browser activity event from Chrome extension"""
     event_type = event_data.get("type")
+    if not event_type:
+        raise HTTPException(status_code=400, detail="type is required")
     
     # Filter out noisy browser events
     noisy_events = [
@@ -298,22 +320,70 @@ async def add_browser_event(event_data: dict):
     if event_type in noisy_events:
         return {"message": "Noisy browser event filtered out", "event_id": None}
     
-    event = await Event.create_browser_event(
+    event_id = await trackers.add_browser_event(
         event_type=event_type,
         url=event_data.get("url"),
         title=event_data.get("title"),
         details=event_data.get("details", {})
     )
-    return {"message": "Browser event added", "event_id": event.id}
+    if event_id is None:
+        return {"message": "Browser event spooled until the database is available", "event_id": None}
+    return {"message": "Browser event added", "event_id": event_id}
 
 @app.delete("/clear-database")
 async def clear_database():
     """Clear all events from the database"""
     try:
-        await Event.clear_all_events()
+        await trackers.clear_events()
+        # Cached closed buckets would otherwise keep counting deleted events
+        timeline_cache.clear()
         return {"message": "Database cleared successfully"}
+    except IngestError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to clear database: {str(e)}")
 
+@app.get("/export")
+async def export_events(
+    format: str = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    event_type: Optional[List[str]] = Query(None)
+):
+    """Stream event history as NDJSON or gzipped CSV, filtered by time range and type"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid format. Must be 'ndjson' or 'csv'")
+    
+    return StreamingResponse(
+        stream_export(format, start, end, event_type),
+        media_type=export_media_type(format),
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(format)}"'}
+    )
+
+@app.post("/import")
+async def import_events(request: Request, format: str = "ndjson"):
+    """Import an NDJSON or CSV (optionally gzipped) export sent as the request body"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid format. Must be 'ndjson' or 'csv'")
+    
+    # Spool the upload to disk so memory stays flat however large it is; the
+    # tracker owner (possibly the ingestion daemon) reads it back by path
+    with tempfile.NamedTemporaryFile(prefix="whatido_import_") as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        upload.flush()
+        try:
+            result = await trackers.import_events(upload.name, format)
+        except IngestCommandError as e:
+            raise HTTPException(status_code=400, detail=f"Failed to import events: {str(e)}")
+        except IngestError:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Failed to import events: {str(e)}")
+    # Imported events usually land in buckets that are already closed and cached
+    timeline_cache.clear()
+    
+    return {"message": f"Imported {result['imported']} events", **result}
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,123 +1,400 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Boolean, update
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Boolean, LargeBinary, Float, Date, ForeignKey, Index, update, select, insert, and_, true, type_coerce
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 from database import Base
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-import json
+from datetime import datetime, timedelta, time, timezone
+from typing import List, Dict, Any, Optional, AsyncIterator, Sequence, Iterable, Set, Tuple
+import hashlib
+import orjson
+import os
+import zlib
+
+# Details payloads at least this large are zlib-compressed when it saves space
+COMPRESS_DETAILS = os.getenv("COMPRESS_DETAILS", "true").lower() in ("1", "true", "yes")
+COMPRESS_MIN_BYTES = 256
+# Keep multi-row INSERT/IN statements under SQLite's bound-parameter limit
+_SQL_CHUNK = 300
+
+# Process-local caches of committed rows known to exist; reset on clear.
+# Rows added by an open transaction are kept in its session's info and only
+# published here once it commits, so nothing can reuse a rolled-back id.
+_path_ids: Dict[str, int] = {}
+_known_details: set = set()
+_KNOWN_DETAILS_LIMIT = 100000
+_PENDING_PATH_IDS = "pending_path_ids"
+_PENDING_DETAILS = "pending_details"
+
+def utc_now() -> datetime:
+    """Naive UTC now, matching SQLite's CURRENT_TIMESTAMP column default"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def reset_storage_caches():
+    """Forget cached path ids and details hashes (after the tables are cleared)"""
+    _path_ids.clear()
+    _known_details.clear()
+
+@event.listens_for(Session, "after_commit")
+def _publish_storage_caches(session):
+    """Cache the paths and details a transaction stored, now that they are durable"""
+    _path_ids.update(session.info.pop(_PENDING_PATH_IDS, {}))
+    details = session.info.pop(_PENDING_DETAILS, set())
+    if len(_known_details) + len(details) > _KNOWN_DETAILS_LIMIT:
+        _known_details.clear()
+    _known_details.update(details)
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_storage_caches(session, transaction):
+    """Drop what a rolled-back or abandoned transaction stored"""
+    if transaction.parent is None:
+        session.info.pop(_PENDING_PATH_IDS, None)
+        session.info.pop(_PENDING_DETAILS, None)
+
+class FilePath(Base):
+    __tablename__ = "file_paths"
+    # Ids are never reused, so an id cached before a clear cannot name another path
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    id = Column(Integer, primary_key=True)
+    path = Column(String, unique=True, nullable=False)
+    
+    @classmethod
+    async def intern(cls, session, paths: Iterable[str]) -> Dict[str, int]:
+        """Get ids for paths, inserting any that are not in the dictionary yet"""
+        paths = set(paths)
+        pending = session.info.setdefault(_PENDING_PATH_IDS, {})
+        missing = [path for path in paths if path not in _path_ids and path not in pending]
+        for i in range(0, len(missing), _SQL_CHUNK):
+            chunk = missing[i:i + _SQL_CHUNK]
+            await session.execute(
+                sqlite_insert(cls)
+                .values([{"path": path} for path in chunk])
+                .on_conflict_do_nothing(index_elements=["path"])
+            )
+            result = await session.execute(select(cls.id, cls.path).where(cls.path.in_(chunk)))
+            pending.update({path: path_id for path_id, path in result.all()})
+        return {path: _path_ids[path] if path in _path_ids else pending[path] for path in paths}
+
+class EventDetails(Base):
+    __tablename__ = "event_details"
+    
+    hash = Column(String, primary_key=True)  # blake2b-128 of the canonical JSON
+    data = Column(LargeBinary, nullable=False)
+    compressed = Column(Boolean, default=False)
+    
+    @staticmethod
+    def encode(details: Optional[Dict[str, Any]]) -> Tuple[Optional[str], Optional[Tuple[bytes, bool]]]:
+        """Hash a details payload and prepare its stored (data, compressed) form"""
+        if not details:
+            return None, None
+        data = orjson.dumps(details, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        if COMPRESS_DETAILS and len(data) >= COMPRESS_MIN_BYTES:
+            packed = zlib.compress(data, 6)
+            if len(packed) < len(data):
+                return digest, (packed, True)
+        return digest, (data, False)
+    
+    @staticmethod
+    def decode(data: Optional[bytes], compressed: Optional[bool]) -> Optional[bytes]:
+        """Turn a stored payload back into JSON bytes"""
+        if data is None:
+            return None
+        return zlib.decompress(data) if compressed else data
+    
+    @classmethod
+    async def store(cls, session, blobs: Dict[str, Tuple[bytes, bool]]):
+        """Insert payloads that are not stored yet; identical payloads are kept once"""
+        pending = session.info.setdefault(_PENDING_DETAILS, set())
+        new = [(digest, blob) for digest, blob in blobs.items() if digest not in _known_details and digest not in pending]
+        if new:
+            # executemany: one cached statement however many payloads there are
+            await session.execute(
+                sqlite_insert(cls).on_conflict_do_nothing(index_elements=["hash"]),
+                [{"hash": digest, "data": data, "compressed": compressed} for digest, (data, compressed) in new]
+            )
+        pending.update(digest for digest, _ in new)
 
 class Event(Base):
     __tablename__ = "events"
     
     id = Column(Integer, primary_key=True, index=True)
     event_type = Column(String, nullable=False)  # file_created, file_modified, git_add, git_commit, git_push, browser_tab, browser_click, etc.
-    timestamp = Column(DateTime, default=func.now())
-    file_path = Column(String, nullable=True)
+    timestamp = Column(DateTime, default=func.now(), index=True)
+    file_path = Column(String, nullable=True)  # Legacy rows only; new rows use path_id
+    path_id = Column(Integer, ForeignKey("file_paths.id"), nullable=True, index=True)
+    repo_id = Column(Integer, ForeignKey("file_paths.id"), nullable=True)  # Tracked root the event came from
     git_hash = Column(String, nullable=True)
     git_message = Column(Text, nullable=True)
     url = Column(String, nullable=True)
     title = Column(String, nullable=True)
-    details = Column(JSON, nullable=True)  # Additional event-specific data
+    details = Column(JSON, nullable=True)  # Legacy rows only; new rows use details_hash
+    details_hash = Column(String, ForeignKey("event_details.hash"), nullable=True)  # Additional event-specific data
+    
+    __table_args__ = (
+        # Covers time-bucketed GROUP BY queries on type, file and repo
+        Index("ix_events_timestamp_type", "timestamp", "event_type", "path_id", "repo_id"),
+    )
     
     @classmethod
-    async def create_file_event(cls, event_type: str, file_path: str, details: Dict[str, Any] = None):
-        """Create a file-related event"""
+    async def _encode_rows(cls, session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Swap file paths and details for dictionary ids and content hashes"""
+        path_ids = await FilePath.intern(session, (
+            path for row in rows for path in (row.get("file_path"), row.get("repo_path")) if path
+        ))
+        blobs = {}
+        encoded = []
+        for row in rows:
+            values = dict(row)
+            file_path = values.pop("file_path", None)
+            values["path_id"] = path_ids[file_path] if file_path else None
+            repo_path = values.pop("repo_path", None)
+            values["repo_id"] = path_ids[repo_path] if repo_path else None
+            details_hash, blob = EventDetails.encode(values.pop("details", None))
+            values["details_hash"] = details_hash
+            if blob:
+                blobs[details_hash] = blob
+            encoded.append(values)
+        await EventDetails.store(session, blobs)
+        return encoded
+    
+    @classmethod
+    async def _create(cls, **values):
+        """Create a single event, or spool it if the database is temporarily unavailable (returns None)
+
+        Only OperationalError (locked, disk full, I/O) is spooled; data errors
+        such as an IntegrityError are raised to the caller.
+        """
+        from event_spool import spool
+        
+        # Once events are spooled, later ones queue behind them to keep their order
+        if spool.pending:
+            spool.append(values)
+            return None
+        try:
+            return await cls._insert_one(values)
+        except OperationalError as e:
+            print(f"Database write failed, spooling event: {e}")
+            spool.append(values)
+            return None
+    
+    @classmethod
+    async def _insert_one(cls, values: Dict[str, Any]):
+        """Insert a single event with deduplicated path and details storage"""
         from database import AsyncSessionLocal
         async with AsyncSessionLocal() as session:
-            event = cls(
-                event_type=event_type,
-                file_path=file_path,
-                details=details or {}
-            )
+            event = cls(**(await cls._encode_rows(session, [values]))[0])
             session.add(event)
             await session.commit()
             await session.refresh(event)
             return event
     
     @classmethod
-    async def create_git_event(cls, event_type: str, git_hash: str = None, git_message: str = None, details: Dict[str, Any] = None):
+    async def create_file_event(cls, event_type: str, file_path: str, details: Dict[str, Any] = None, repo_path: str = None):
+        """Create a file-related event"""
+        return await cls._create(
+            event_type=event_type,
+            file_path=file_path,
+            repo_path=repo_path,
+            details=details or {}
+        )
+    
+    @classmethod
+    async def create_git_event(cls, event_type: str, git_hash: str = None, git_message: str = None, details: Dict[str, Any] = None, repo_path: str = None):
         """Create a Git-related event"""
-        from database import AsyncSessionLocal
-        async with AsyncSessionLocal() as session:
-            event = cls(
-                event_type=event_type,
-                git_hash=git_hash,
-                git_message=git_message,
-                details=details or {}
-            )
-            session.add(event)
-            await session.commit()
-            await session.refresh(event)
-            return event
+        return await cls._create(
+            event_type=event_type,
+            repo_path=repo_path,
+            git_hash=git_hash,
+            git_message=git_message,
+            details=details or {}
+        )
     
     @classmethod
     async def create_browser_event(cls, event_type: str, url: str = None, title: str = None, details: Dict[str, Any] = None):
         """Create a browser-related event"""
+        return await cls._create(
+            event_type=event_type,
+            url=url,
+            title=title,
+            details=details or {}
+        )
+    
+    @classmethod
+    def _row_select(cls):
+        """Select plain event columns, joining paths and details back in"""
+        return select(
+            cls.id,
+            cls.event_type,
+            cls.timestamp,
+            func.coalesce(FilePath.path, cls.file_path).label("file_path"),
+            cls.git_hash,
+            cls.git_message,
+            cls.url,
+            cls.title,
+            type_coerce(cls.details, Text).label("details"),
+            EventDetails.data.label("details_data"),
+            EventDetails.compressed.label("details_compressed"),
+        ).select_from(cls).outerjoin(
+            FilePath, FilePath.id == cls.path_id
+        ).outerjoin(
+            EventDetails, EventDetails.hash == cls.details_hash
+        )
+    
+    @staticmethod
+    def details_json(row):
+        """Raw details JSON of a row: the stored payload, or the legacy column"""
+        if row.details_data is not None:
+            return EventDetails.decode(row.details_data, row.details_compressed)
+        return row.details
+    
+    @classmethod
+    def _recent_filter(cls, hours: int):
+        """Filter for events from the last N hours"""
+        return cls.timestamp >= datetime.now() - timedelta(hours=hours)
+    
+    @classmethod
+    def _daily_filter(cls):
+        """Filter for events from today (a range, so the timestamp index is usable)"""
+        start = datetime.combine(datetime.now().date(), time.min)
+        return and_(cls.timestamp >= start, cls.timestamp < start + timedelta(days=1))
+    
+    @classmethod
+    def _range_filter(cls, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      event_types: Optional[List[str]] = None):
+        """Filter for events in [start, end) of the given types"""
+        conditions = []
+        if start:
+            conditions.append(cls.timestamp >= start)
+        if end:
+            conditions.append(cls.timestamp < end)
+        if event_types:
+            conditions.append(cls.event_type.in_(event_types))
+        return and_(true(), *conditions)
+    
+    @classmethod
+    async def _fetch_rows(cls, where) -> Sequence[Any]:
+        """Fetch plain row tuples matching a filter, newest first"""
         from database import AsyncSessionLocal
+        
         async with AsyncSessionLocal() as session:
-            event = cls(
-                event_type=event_type,
-                url=url,
-                title=title,
-                details=details or {}
+            result = await session.execute(
+                cls._row_select().where(where).order_by(cls.timestamp.desc())
             )
-            session.add(event)
-            await session.commit()
-            await session.refresh(event)
-            return event
+            return result.all()
     
     @classmethod
-    async def get_recent_events(cls, hours: int = 3) -> List[Dict[str, Any]]:
-        """Get events from the last N hours"""
+    async def stream_rows(cls, where, chunk_size: int = 1000, ascending: bool = False) -> AsyncIterator[Sequence[Any]]:
+        """Stream plain row tuples matching a filter in chunks, newest first unless ascending"""
         from database import AsyncSessionLocal
-        from sqlalchemy import select
         
+        order = (cls.timestamp.asc(), cls.id.asc()) if ascending else (cls.timestamp.desc(),)
         async with AsyncSessionLocal() as session:
-            cutoff_time = datetime.now() - timedelta(hours=hours)
-            result = await session.execute(
-                select(cls).where(cls.timestamp >= cutoff_time).order_by(cls.timestamp.desc())
+            result = await session.stream(
+                cls._row_select()
+                .where(where)
+                .order_by(*order)
+                .execution_options(yield_per=chunk_size)
             )
-            events = result.scalars().all()
-            return [cls._event_to_dict(event) for event in events]
+            async for rows in result.partitions(chunk_size):
+                yield rows
+    
+    @classmethod
+    def stream_recent_rows(cls, hours: int = 3, chunk_size: int = 1000) -> AsyncIterator[Sequence[Any]]:
+        """Stream row tuples for events from the last N hours"""
+        return cls.stream_rows(cls._recent_filter(hours), chunk_size)
+    
+    @classmethod
+    async def get_recent_events(cls, hours: int = 3) -> List[Dict[str, Any]]:
+        """Get events from the last N hours"""
+        rows = await cls._fetch_rows(cls._recent_filter(hours))
+        return [cls._row_to_dict(row) for row in rows]
     
     @classmethod
     async def get_daily_events(cls) -> List[Dict[str, Any]]:
         """Get events from today"""
+        rows = await cls._fetch_rows(cls._daily_filter())
+        return [cls._row_to_dict(row) for row in rows]
+    
+    @classmethod
+    async def insert_many(cls, session, rows: List[Dict[str, Any]]) -> int:
+        """Bulk insert event rows (column dicts) in the caller's transaction"""
+        if not rows:
+            return 0
+        await session.execute(insert(cls), await cls._encode_rows(session, rows))
+        return len(rows)
+    
+    @classmethod
+    async def create_many(cls, rows: List[Dict[str, Any]], batch_size: int = 5000) -> int:
+        """Create many events in one transaction"""
         from database import AsyncSessionLocal
-        from sqlalchemy import select
         
+        created = 0
+        async with AsyncSessionLocal() as session:
+            for i in range(0, len(rows), batch_size):
+                created += await cls.insert_many(session, rows[i:i + batch_size])
+            await session.commit()
+        return created
+    
+    @classmethod
+    async def get_git_hashes(cls, repo_path: str, event_type: str = "git_commit") -> Set[str]:
+        """Hashes of the Git events of one type already recorded for a repository"""
+        from database import AsyncSessionLocal
+
         async with AsyncSessionLocal() as session:
-            today = datetime.now().date()
             result = await session.execute(
-                select(cls).where(
-                    func.date(cls.timestamp) == today
-                ).order_by(cls.timestamp.desc())
+                select(cls.git_hash)
+                .join(FilePath, FilePath.id == cls.repo_id)
+                .where(FilePath.path == repo_path, cls.event_type == event_type, cls.git_hash.isnot(None))
             )
-            events = result.scalars().all()
-            return [cls._event_to_dict(event) for event in events]
+            return set(result.scalars())
+
+    @classmethod
+    async def get_high_water_mark(cls) -> int:
+        """Id of the newest event (0 if there are none)"""
+        from database import AsyncSessionLocal
+        
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(func.max(cls.id)))
+            return result.scalar() or 0
     
     @classmethod
     async def clear_all_events(cls):
-        """Clear all events from the database"""
+        """Clear all events from the database, with the reports and index derived from them.
+
+        Details payloads are kept: they are content-addressed, so a hash cached
+        by an insert racing the clear still resolves to the right payload.
+        """
         from database import AsyncSessionLocal
         from sqlalchemy import delete
         
+        # Inserts that start from here look paths up again
+        reset_storage_caches()
         async with AsyncSessionLocal() as session:
+            # Event ids restart after a clear, so stored high-water marks would no longer mean anything
+            for index_table in (FileActivity, FileActivityDay, FileCommit, IndexCursor, Report):
+                await session.execute(delete(index_table))
             await session.execute(delete(cls))
+            await session.execute(delete(FilePath))
             await session.commit()
+        reset_storage_caches()
     
-    @staticmethod
-    def _event_to_dict(event) -> Dict[str, Any]:
-        """Convert event to dictionary"""
+    @classmethod
+    def _row_to_dict(cls, row) -> Dict[str, Any]:
+        """Convert a plain event row to a dictionary"""
+        details = cls.details_json(row)
         return {
-            "id": event.id,
-            "event_type": event.event_type,
-            "timestamp": event.timestamp.isoformat(),
-            "file_path": event.file_path,
-            "git_hash": event.git_hash,
-            "git_message": event.git_message,
-            "url": event.url,
-            "title": event.title,
-            "details": event.details or {}
+            "id": row.id,
+            "event_type": row.event_type,
+            "timestamp": row.timestamp.isoformat(),
+            "file_path": row.file_path,
+            "git_hash": row.git_hash,
+            "git_message": row.git_message,
+            "url": row.url,
+            "title": row.title,
+            "details": (orjson.loads(details) if details else None) or {}
         }
 
 class RepoPath(Base):
@@ -157,3 +434,122 @@ class RepoPath(Base):
                 await session.commit()
                 await session.refresh(new_path)
                 return new_path
+
+class Report(Base):
+    __tablename__ = "reports"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # daily_report, suggestions
+    period = Column(String, nullable=True)  # Day a daily report covers
+    content = Column(JSON, nullable=True)
+    high_water_mark = Column(Integer, nullable=False)  # Newest event id the report covers
+    generated_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index("ix_reports_kind_period", "kind", "period", "id"),
+    )
+    
+    # Older reports of a kind are pruned beyond this many
+    KEEP_PER_KIND = 10
+    
+    @classmethod
+    async def latest(cls, kind: str, period: str = None) -> Optional[Dict[str, Any]]:
+        """Get the newest stored report of a kind"""
+        from database import AsyncSessionLocal
+        
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(cls).where(cls.kind == kind, cls.period == period).order_by(cls.id.desc()).limit(1)
+            )
+            report = result.scalar_one_or_none()
+            return cls._report_to_dict(report) if report else None
+    
+    @classmethod
+    async def save(cls, kind: str, content: Any, high_water_mark: int, period: str = None) -> Dict[str, Any]:
+        """Store a newly generated report and prune old ones"""
+        from database import AsyncSessionLocal
+        from sqlalchemy import delete
+        
+        async with AsyncSessionLocal() as session:
+            report = cls(kind=kind, period=period, content=content, high_water_mark=high_water_mark)
+            session.add(report)
+            await session.flush()
+            newest = select(cls.id).where(cls.kind == kind).order_by(cls.id.desc()).limit(cls.KEEP_PER_KIND)
+            await session.execute(
+                delete(cls).where(cls.kind == kind, cls.id.not_in(newest.scalar_subquery()))
+            )
+            await session.commit()
+            await session.refresh(report)
+            return cls._report_to_dict(report)
+    
+    @staticmethod
+    def _report_to_dict(report) -> Dict[str, Any]:
+        """Convert report to dictionary"""
+        return {
+            "content": report.content,
+            "period": report.period,
+            "high_water_mark": report.high_water_mark,
+            "generated_at": report.generated_at.isoformat()
+        }
+
+class FileActivity(Base):
+    __tablename__ = "file_activity"
+    
+    # Per-file totals, maintained incrementally from events by ActivityIndexer
+    path_id = Column(Integer, ForeignKey("file_paths.id"), primary_key=True)
+    repo_id = Column(Integer, ForeignKey("file_paths.id"), nullable=True)
+    edits = Column(Integer, nullable=False, default=0)
+    active_seconds = Column(Float, nullable=False, default=0)  # Estimated from gaps between edits
+    commits = Column(Integer, nullable=False, default=0)
+    insertions = Column(Integer, nullable=False, default=0)
+    deletions = Column(Integer, nullable=False, default=0)
+    first_touched = Column(DateTime, nullable=True)
+    last_touched = Column(DateTime, nullable=True)
+    last_edit = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        # All-time rankings are read straight off these indexes
+        Index("ix_file_activity_active_seconds", "active_seconds"),
+        Index("ix_file_activity_edits", "edits"),
+        Index("ix_file_activity_commits", "commits"),
+        Index("ix_file_activity_last_touched", "last_touched"),
+    )
+
+class FileActivityDay(Base):
+    __tablename__ = "file_activity_days"
+    
+    # The same totals per file and UTC day, for rankings over a window
+    path_id = Column(Integer, ForeignKey("file_paths.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    repo_id = Column(Integer, ForeignKey("file_paths.id"), nullable=True)
+    edits = Column(Integer, nullable=False, default=0)
+    active_seconds = Column(Float, nullable=False, default=0)
+    commits = Column(Integer, nullable=False, default=0)
+    insertions = Column(Integer, nullable=False, default=0)
+    deletions = Column(Integer, nullable=False, default=0)
+    last_touched = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_file_activity_days_day", "day", "repo_id"),
+    )
+
+class FileCommit(Base):
+    __tablename__ = "file_commits"
+    
+    # Commits that changed a file, linked from git_commit events
+    path_id = Column(Integer, ForeignKey("file_paths.id"), primary_key=True)
+    git_hash = Column(String, primary_key=True)
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+    insertions = Column(Integer, nullable=False, default=0)
+    deletions = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("ix_file_commits_path_timestamp", "path_id", "timestamp"),
+    )
+
+class IndexCursor(Base):
+    __tablename__ = "index_cursors"
+    
+    name = Column(String, primary_key=True)
+    high_water_mark = Column(Integer, nullable=False, default=0)  # Newest event id the index covers
@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from watchdog.events import FileCreatedEvent, FileDeletedEvent, FileModifiedEvent
+
+from fs_scan import FileStat, default_workers, scan_dir
+
+# Polling replaces inotify/FSEvents on NFS, SMB and bind-mounted volumes
+POLL_INTERVAL_SECONDS = float(os.getenv("POLL_INTERVAL_SECONDS", "2"))
+# Share of one CPU that polling may use, measured as process CPU time during a pass;
+# passes that burn more CPU wait longer. Time spent waiting on the share does not count
+POLL_CPU_BUDGET = float(os.getenv("POLL_CPU_BUDGET", "0.1"))
+# Every Nth pass re-lists all directories, to catch in-place writes that
+# do not change their directory's mtime
+POLL_FULL_SCAN_EVERY = int(os.getenv("POLL_FULL_SCAN_EVERY", "15"))
+
+def _dir_mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _list_dir(path: str, should_ignore) -> Tuple[Optional[int], Dict[str, FileStat], List[str]]:
+    """Directory mtime (None if gone) with its files and subdirectories"""
+    # Stat first: a change made while listing shows up on the next pass
+    mtime = _dir_mtime(path)
+    if mtime is None:
+        return None, {}, []
+    files, subdirs = scan_dir(path, should_ignore)
+    return mtime, files, subdirs
+
+class ScandirPollingObserver(threading.Thread):
+    """Drop-in for watchdog's Observer that polls with a directory-mtime index.
+
+    Each pass stats every known directory in parallel and only re-lists those
+    whose mtime changed, so unchanged subtrees cost one stat per directory.
+    Renames are reported as a delete plus a create.
+    """
+
+    def __init__(self, interval: float = POLL_INTERVAL_SECONDS, cpu_budget: float = POLL_CPU_BUDGET,
+                 full_scan_every: int = POLL_FULL_SCAN_EVERY, workers: Optional[int] = None):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.cpu_budget = min(max(cpu_budget, 0.01), 1.0)
+        self.full_scan_every = max(full_scan_every, 1)
+        self.workers = workers or default_workers()
+        self.handler = None
+        self.root = None
+        self.dir_mtimes: Dict[str, int] = {}
+        self.dir_files: Dict[str, Dict[str, FileStat]] = {}
+        self.dir_subdirs: Dict[str, Set[str]] = {}
+        self._stopped = threading.Event()
+        self._baseline = True  # The first listing records state without emitting events
+
+    def schedule(self, event_handler, path: str, recursive: bool = True):
+        """Watch path (always recursively) and dispatch events to event_handler"""
+        self.handler = event_handler
+        self.root = path
+
+    def stop(self):
+        self._stopped.set()
+
+    def _should_ignore(self, path: str) -> bool:
+        should_ignore = getattr(self.handler, "should_ignore", None)
+        return should_ignore(path) if should_ignore else False
+
+    def _emit(self, event):
+        if not self._baseline:
+            self.handler.dispatch(event)
+
+    def _drop_dir(self, path: str):
+        """Forget a vanished directory, reporting its files as deleted"""
+        self.dir_mtimes.pop(path, None)
+        for file_path in self.dir_files.pop(path, {}):
+            self._emit(FileDeletedEvent(file_path))
+        for subdir in self.dir_subdirs.pop(path, set()):
+            self._drop_dir(subdir)
+
+    def _apply(self, path: str, mtime: Optional[int], files: Dict[str, FileStat], subdirs: List[str]) -> List[str]:
+        """Diff one directory listing against the index; returns subdirectories not seen before"""
+        if mtime is None:
+            self._drop_dir(path)
+            return []
+
+        old_files = self.dir_files.get(path, {})
+        for file_path, stat in files.items():
+            old = old_files.get(file_path)
+            if old is None:
+                self._emit(FileCreatedEvent(file_path))
+            elif old != stat:
+                self._emit(FileModifiedEvent(file_path))
+        for file_path in old_files.keys() - files.keys():
+            self._emit(FileDeletedEvent(file_path))
+
+        current = set(subdirs)
+        for subdir in self.dir_subdirs.get(path, set()) - current:
+            self._drop_dir(subdir)
+
+        self.dir_mtimes[path] = mtime
+        self.dir_files[path] = files
+        self.dir_subdirs[path] = current
+        return [subdir for subdir in subdirs if subdir not in self.dir_mtimes]
+
+    def _relist(self, pool: ThreadPoolExecutor, dirs: List[str]):
+        """Re-list directories in parallel, descending breadth-first into new ones"""
+        while dirs:
+            listings = pool.map(lambda path: _list_dir(path, self._should_ignore), dirs)
+            new_dirs = []
+            for path, (mtime, files, subdirs) in zip(dirs, listings):
+                # Skip directories dropped with a parent earlier in this pass
+                if self._is_tracked(path):
+                    new_dirs.extend(self._apply(path, mtime, files, subdirs))
+            dirs = new_dirs
+
+    def _is_tracked(self, path: str) -> bool:
+        return (
+            path == self.root
+            or path in self.dir_mtimes
+            or path in self.dir_subdirs.get(os.path.dirname(path), ())
+        )
+
+    def _poll(self, pool: ThreadPoolExecutor, full: bool):
+        """One pass: stat every known directory, re-list the changed ones"""
+        dirs = list(self.dir_mtimes)
+        if full:
+            changed = dirs
+        else:
+            mtimes = pool.map(_dir_mtime, dirs)
+            changed = [path for path, mtime in zip(dirs, mtimes) if mtime != self.dir_mtimes.get(path)]
+        # Parents first, so a vanished subtree is dropped once
+        changed.sort(key=len)
+        self._relist(pool, changed)
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            self._baseline = True
+            self._relist(pool, [self.root])
+            self._baseline = False
+
+            passes = 0
+            while not self._stopped.is_set():
+                started = time.monotonic()
+                # Process CPU time: waiting on a slow share costs no CPU, so it is not throttled
+                cpu_started = time.process_time()
+                passes += 1
+                try:
+                    self._poll(pool, full=passes % self.full_scan_every == 0)
+                except Exception as e:
+                    print(f"Error polling {self.root}: {e}")
+                elapsed = time.monotonic() - started
+                cpu = time.process_time() - cpu_started
+                # Keep CPU use within the budget over pass plus wait, but never poll faster than the interval
+                self._stopped.wait(max(self.interval, cpu / self.cpu_budget - elapsed))
@@ -0,0 +1,165 @@
+import asyncio
+import os
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional
+
+from models import Event, Report, utc_now
+
+# Reports are regenerated in the background once enough new events have
+# arrived, or once they are old and anything at all has changed
+REPORT_CHECK_SECONDS = float(os.getenv("REPORT_CHECK_SECONDS", "60"))
+REPORT_MIN_NEW_EVENTS = int(os.getenv("REPORT_MIN_NEW_EVENTS", "50"))
+REPORT_MAX_AGE_SECONDS = float(os.getenv("REPORT_MAX_AGE_SECONDS", "1800"))
+
+REPORT_KINDS = {"daily_report", "suggestions"}
+
+def report_period(kind: str) -> Optional[str]:
+    """Daily reports are per day; suggestions always cover the last 24 hours"""
+    return datetime.now().date().isoformat() if kind == "daily_report" else None
+
+class ReportGenerationError(RuntimeError):
+    """Gemini failed to produce a report; the previous one stays current"""
+
+class ReportScheduler:
+    """Precomputes daily reports and suggestions so requests can be served instantly"""
+
+    def __init__(self):
+        self.gemini_service = None
+        self.task = None
+        self.locks = {kind: asyncio.Lock() for kind in REPORT_KINDS}
+        self.background = set()
+
+    def start(self):
+        """Start the background regeneration loop"""
+        from gemini_service import GeminiService
+
+        try:
+            self.gemini_service = GeminiService()
+        except ValueError as e:
+            print(f"Report precomputation disabled: {e}")
+            return
+        if not self.task:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background loop and any regeneration in progress"""
+        for task in [self.task, *self.background]:
+            if task:
+                task.cancel()
+        for task in [self.task, *self.background]:
+            if task:
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.task = None
+        self.background.clear()
+
+    @asynccontextmanager
+    async def paused(self) -> AsyncIterator[None]:
+        """Hold off report generation, so no report is saved from events being cleared"""
+        async with AsyncExitStack() as stack:
+            for kind in sorted(REPORT_KINDS):
+                await stack.enter_async_context(self.locks[kind])
+            yield
+
+    async def _generate(self, kind: str) -> Dict[str, Any]:
+        """Generate a report from current events and persist it with its high-water mark"""
+        if not self.gemini_service:
+            raise RuntimeError("Gemini service not initialized")
+        high_water_mark = await Event.get_high_water_mark()
+        try:
+            if kind == "daily_report":
+                events = await Event.get_daily_events()
+                content = await self.gemini_service.generate_daily_report(events)
+            else:
+                events = await Event.get_recent_events(24)  # Last 24 hours
+                content = await self.gemini_service.generate_suggestions(events)
+        except Exception as e:
+            # Nothing is saved, so the report is still due and is retried on the next check
+            raise ReportGenerationError(f"Error generating {kind}: {e}") from e
+        return await Report.save(kind, content, high_water_mark, report_period(kind))
+
+    async def refresh(self, kind: str) -> Dict[str, Any]:
+        """Regenerate a report now; concurrent callers share one generation"""
+        if kind not in REPORT_KINDS:
+            raise ValueError(f"Unknown report kind: {kind}")
+        lock = self.locks[kind]
+        if lock.locked():
+            async with lock:
+                latest = await Report.latest(kind, report_period(kind))
+                if latest:
+                    return latest
+        async with lock:
+            return await self._generate(kind)
+
+    def revalidate(self, kind: str):
+        """Regenerate a report in the background unless that is already happening"""
+        if kind not in REPORT_KINDS:
+            raise ValueError(f"Unknown report kind: {kind}")
+        if self.locks[kind].locked() or not self.gemini_service:
+            return
+        task = asyncio.create_task(self._revalidate(kind))
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+
+    async def _revalidate(self, kind: str):
+        try:
+            await self.refresh(kind)
+        except ReportGenerationError as e:
+            print(f"Background regeneration failed, keeping the previous report: {e}")
+
+    @staticmethod
+    def _is_due(latest: Optional[Dict[str, Any]], high_water_mark: int) -> bool:
+        if latest is None:
+            return high_water_mark > 0
+        new_events = high_water_mark - latest["high_water_mark"]
+        if new_events <= 0:
+            return False
+        age = (utc_now() - datetime.fromisoformat(latest["generated_at"])).total_seconds()
+        return new_events >= REPORT_MIN_NEW_EVENTS or age >= REPORT_MAX_AGE_SECONDS
+
+    async def _run(self):
+        """Check periodically whether each report is due for regeneration"""
+        while True:
+            await asyncio.sleep(REPORT_CHECK_SECONDS)
+            try:
+                high_water_mark = await Event.get_high_water_mark()
+                for kind in sorted(REPORT_KINDS):
+                    latest = await Report.latest(kind, report_period(kind))
+                    if not self._is_due(latest, high_water_mark):
+                        continue
+                    try:
+                        await self.refresh(kind)
+                        print(f"Regenerated {kind} up to event {high_water_mark}")
+                    except ReportGenerationError as e:
+                        print(f"{e}; keeping the previous report and retrying on the next check")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error precomputing reports: {e}")
+
+async def serve_report(owner, kind: str, refresh: bool = False, stale_while_revalidate: bool = False) -> Dict[str, Any]:
+    """Latest stored report, generated on demand if forced or missing.
+
+    `owner` is the TrackerManager (or its IngestClient proxy) that runs the
+    scheduler. With `stale_while_revalidate`, a report that does not cover the
+    newest events is returned as-is while a fresh one is generated. If a forced
+    regeneration fails, the previous report is returned with an `error`.
+    """
+    latest = await Report.latest(kind, report_period(kind))
+    if refresh or latest is None:
+        try:
+            return {**await owner.refresh_report(kind), "stale": False}
+        except Exception as e:
+            # A failed generation saves nothing; fall back to the report we already have
+            if latest is None:
+                raise
+            print(f"Regenerating {kind} failed, serving the previous report: {e}")
+            latest = {**latest, "error": str(e)}
+
+    stale = latest["high_water_mark"] < await Event.get_high_water_mark()
+    if stale and stale_while_revalidate and not refresh:
+        await owner.revalidate_report(kind)
+    return {**latest, "stale": stale}
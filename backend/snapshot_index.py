@@ -0,0 +1,181 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from fs_scan import FileStat, default_workers
+
+# Local cache of what each tracked root looked like, so changes made while
+# the tracker was down can be replayed at startup
+SNAPSHOT_DB_PATH = os.getenv("SNAPSHOT_DB_PATH", "./whatido_snapshots.db")
+# Hash file contents so touch-only mtime changes are not reported
+SNAPSHOT_HASH = os.getenv("SNAPSHOT_HASH", "false").lower() in ("1", "true", "yes")
+
+# (size, mtime_ns, inode, content hash or None)
+Entry = Tuple[int, int, int, Optional[str]]
+
+def hash_file(path: str) -> Optional[str]:
+    """Content hash of a file, or None if it cannot be read"""
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+class SnapshotIndex:
+    def __init__(self, root: str, db_path: str = SNAPSHOT_DB_PATH, use_hash: bool = SNAPSHOT_HASH):
+        self.root = root
+        self.db_path = db_path
+        self.use_hash = use_hash
+        self.entries: Dict[str, Entry] = {}
+        self.dirty: Dict[str, Optional[Entry]] = {}  # path -> new entry, or None if deleted
+        self.has_baseline = False
+        self.lock = threading.Lock()
+        # Paths updated by live events while a catch-up scan is running
+        self.touched: Optional[Set[str]] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS snapshot_roots (root TEXT PRIMARY KEY, scanned_at REAL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshot_files ("
+            "root TEXT, path TEXT, size INTEGER, mtime_ns INTEGER, inode INTEGER, hash TEXT, "
+            "PRIMARY KEY (root, path)) WITHOUT ROWID"
+        )
+        return conn
+
+    def load(self):
+        """Load the persisted index for this root"""
+        conn = self._connect()
+        try:
+            self.has_baseline = conn.execute(
+                "SELECT 1 FROM snapshot_roots WHERE root = ?", (self.root,)
+            ).fetchone() is not None
+            rows = conn.execute(
+                "SELECT path, size, mtime_ns, inode, hash FROM snapshot_files WHERE root = ?", (self.root,)
+            )
+            with self.lock:
+                self.entries = {path: (size, mtime_ns, inode, digest) for path, size, mtime_ns, inode, digest in rows}
+                self.dirty.clear()
+        finally:
+            conn.close()
+
+    def begin_scan(self) -> Dict[str, Entry]:
+        """Copy the index before a catch-up scan and start noting live updates"""
+        with self.lock:
+            self.touched = set()
+            return dict(self.entries)
+
+    def end_scan(self):
+        """Stop noting live updates (after a reconcile, or a cancelled scan)"""
+        with self.lock:
+            self.touched = None
+
+    def reconcile(self, previous: Dict[str, Entry], scanned: Dict[str, FileStat]) -> List[Tuple[str, str]]:
+        """Apply a fresh scan to the index and return (event_type, path) for each difference.
+
+        `previous` is the copy taken by begin_scan. Paths updated by live events
+        since then keep their live state and are not reported again.
+        """
+        changes = []
+        candidates = []
+        for path, (size, mtime_ns, inode) in scanned.items():
+            old = previous.get(path)
+            if old is None:
+                changes.append(("file_created", path))
+            elif old[:3] != (size, mtime_ns, inode):
+                candidates.append(path)
+        changes.extend(("file_deleted", path) for path in previous.keys() - scanned.keys())
+
+        # Contents are only read for files whose metadata changed
+        hashes = {}
+        if self.use_hash and candidates:
+            with ThreadPoolExecutor(max_workers=default_workers()) as pool:
+                hashes = dict(zip(candidates, pool.map(hash_file, candidates)))
+        for path in candidates:
+            old_hash = previous[path][3]
+            if not (old_hash and old_hash == hashes.get(path)):
+                changes.append(("file_modified", path))
+
+        with self.lock:
+            touched, self.touched = self.touched or set(), None
+            for path in previous.keys() - scanned.keys() - touched:
+                self.entries.pop(path, None)
+                self.dirty[path] = None
+            for path, stat in scanned.items():
+                if path in touched:
+                    continue
+                old = previous.get(path)
+                digest = hashes.get(path) if path in hashes else (old[3] if old and old[:3] == stat else None)
+                entry = (*stat, digest)
+                if old != entry:
+                    self.entries[path] = entry
+                    self.dirty[path] = entry
+        return [(event_type, path) for event_type, path in changes if path not in touched]
+
+    def record(self, path: str):
+        """Update one file from a live event"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.remove(path)
+            return
+        digest = hash_file(path) if self.use_hash else None
+        entry = (st.st_size, st.st_mtime_ns, st.st_ino, digest)
+        with self.lock:
+            self.entries[path] = entry
+            self.dirty[path] = entry
+            if self.touched is not None:
+                self.touched.add(path)
+
+    def remove(self, path: str):
+        """Drop one file from a live event"""
+        with self.lock:
+            if self.entries.pop(path, None) is not None:
+                self.dirty[path] = None
+            if self.touched is not None:
+                self.touched.add(path)
+
+    def flush(self, baseline: bool = False):
+        """Persist entries changed since the last flush.
+
+        With `baseline`, also mark the root as fully scanned; only a completed
+        reconcile may do that, or a partial index would be diffed as complete.
+        """
+        with self.lock:
+            dirty, self.dirty = self.dirty, {}
+        if not dirty and not baseline:
+            return
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO snapshot_files (root, path, size, mtime_ns, inode, hash) VALUES (?, ?, ?, ?, ?, ?)",
+                    ((self.root, path, *entry) for path, entry in dirty.items() if entry is not None)
+                )
+                conn.executemany(
+                    "DELETE FROM snapshot_files WHERE root = ? AND path = ?",
+                    ((self.root, path) for path, entry in dirty.items() if entry is None)
+                )
+                if baseline:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO snapshot_roots (root, scanned_at) VALUES (?, ?)", (self.root, time.time())
+                    )
+            if baseline:
+                self.has_baseline = True
+        except sqlite3.Error:
+            # Retry on the next flush rather than losing the changes
+            with self.lock:
+                for path, entry in dirty.items():
+                    self.dirty.setdefault(path, entry)
+            raise
+        finally:
+            conn.close()
@@ -0,0 +1,152 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Integer, case, cast, func, select
+from sqlalchemy.orm import aliased
+
+from models import Event, FilePath, utc_now
+
+BUCKET_SECONDS = {"1m": 60, "5m": 300, "1h": 3600, "1d": 86400}
+GROUP_BY_FIELDS = {"event_type", "file", "repo", "domain"}
+# Buckets that have closed only change if events arrive late (spool replay,
+# catch-up scans, imports), so their counts are cached briefly
+CLOSED_BUCKET_TTL_SECONDS = 60
+_CACHE_SIZE = 256
+_EPOCH = datetime(1970, 1, 1)
+
+RepoRoot = aliased(FilePath)
+
+# (bucket start in epoch seconds, group key, count)
+BucketRow = Tuple[int, str, int]
+
+class TimelineCache:
+    """Small TTL cache of grouped counts for time ranges made of closed buckets"""
+
+    def __init__(self, ttl: float = CLOSED_BUCKET_TTL_SECONDS, size: int = _CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self.entries: "OrderedDict[tuple, Tuple[float, List[BucketRow]]]" = OrderedDict()
+
+    def get(self, key: tuple) -> Optional[List[BucketRow]]:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.entries.pop(key, None)
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: tuple, rows: List[BucketRow]):
+        self.entries[key] = (time.monotonic() + self.ttl, rows)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+cache = TimelineCache()
+
+def _to_utc(value: datetime) -> datetime:
+    """Stored timestamps are naive UTC; convert aware inputs to match"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _floor(value: datetime, seconds: int) -> datetime:
+    offset = int((value - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=offset - offset % seconds)
+
+def _group_key(group_by: str):
+    """SQL expression for the group key"""
+    if group_by == "event_type":
+        return Event.event_type
+    if group_by == "file":
+        return func.coalesce(FilePath.path, Event.file_path)
+    if group_by == "repo":
+        return RepoRoot.path
+    # Host part of the URL: after "://", up to the next "/"
+    rest = func.substr(Event.url, func.instr(Event.url, "://") + 3)
+    slash = func.instr(rest, "/")
+    return case(
+        (func.instr(Event.url, "://") == 0, None),
+        (slash > 0, func.substr(rest, 1, slash - 1)),
+        else_=rest
+    )
+
+async def _query(start: datetime, end: datetime, seconds: int, group_by: str) -> List[BucketRow]:
+    """Count events per (bucket, key) in [start, end) with one GROUP BY"""
+    from database import AsyncSessionLocal
+
+    bucket = (cast(func.strftime("%s", Event.timestamp), Integer) // seconds) * seconds
+    key = _group_key(group_by)
+    stmt = select(bucket.label("bucket"), key.label("key"), func.count().label("count")).select_from(Event)
+    if group_by == "file":
+        stmt = stmt.outerjoin(FilePath, FilePath.id == Event.path_id)
+    elif group_by == "repo":
+        stmt = stmt.join(RepoRoot, RepoRoot.id == Event.repo_id)
+    stmt = stmt.where(
+        Event.timestamp >= start,
+        Event.timestamp < end,
+        key.isnot(None)
+    ).group_by("bucket", "key")
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(stmt)
+        return [(row.bucket, row.key, row.count) for row in result]
+
+async def get_timeline(start: Optional[datetime] = None, end: Optional[datetime] = None, bucket: str = "1h",
+                       group_by: str = "event_type", limit: int = 20) -> Dict[str, Any]:
+    """Histogram of events per time bucket, split by group key.
+
+    Keys beyond the `limit` busiest are folded into "other".
+    """
+    if bucket not in BUCKET_SECONDS:
+        raise ValueError(f"Invalid bucket. Must be one of: {', '.join(BUCKET_SECONDS)}")
+    if group_by not in GROUP_BY_FIELDS:
+        raise ValueError(f"Invalid group_by. Must be one of: {', '.join(sorted(GROUP_BY_FIELDS))}")
+
+    seconds = BUCKET_SECONDS[bucket]
+    end = _to_utc(end) if end else utc_now()
+    start = _to_utc(start) if start else end - timedelta(days=1)
+    if start >= end:
+        raise ValueError("from must be before to")
+    start = _floor(start, seconds)
+
+    # Closed buckets come from the cache; only the open one is always recounted
+    open_start = max(start, _floor(utc_now(), seconds))
+    rows = []
+    if start < min(open_start, end):
+        closed_end = min(open_start, end)
+        cache_key = (start, closed_end, seconds, group_by)
+        closed = cache.get(cache_key)
+        if closed is None:
+            closed = await _query(start, closed_end, seconds, group_by)
+            cache.put(cache_key, closed)
+        rows.extend(closed)
+    if open_start < end:
+        rows.extend(await _query(open_start, end, seconds, group_by))
+
+    totals: Dict[str, int] = {}
+    for _, key, count in rows:
+        totals[key] = totals.get(key, 0) + count
+    kept = set(sorted(totals, key=totals.get, reverse=True)[:limit])
+
+    buckets: Dict[int, Dict[str, int]] = {}
+    for bucket_start, key, count in rows:
+        counts = buckets.setdefault(bucket_start, {})
+        name = key if key in kept else "other"
+        counts[name] = counts.get(name, 0) + count
+
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "bucket": bucket,
+        "group_by": group_by,
+        "totals": {key: totals[key] for key in sorted(kept, key=totals.get, reverse=True)},
+        "buckets": [
+            {"start": (_EPOCH + timedelta(seconds=bucket_start)).isoformat(), "counts": buckets[bucket_start]}
+            for bucket_start in sorted(buckets)
+        ]
+    }
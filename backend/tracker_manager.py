@@ -0,0 +1,116 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+from database import init_db
+from models import Event, RepoPath
+from file_tracker import FileTracker
+from git_tracker import GitTracker
+from git_backfill import GitBackfill, GIT_BACKFILL_DAYS
+from event_spool import spool
+from report_scheduler import ReportScheduler
+from file_activity import ActivityIndexer
+from event_archive import IMPORT_BATCH_SIZE, import_events as load_import
+
+class TrackerManager:
+    """Owns the trackers and all event writes.
+
+    Runs inside the API process in standalone mode, or inside the ingestion
+    daemon when the API is served by several workers.
+    """
+
+    def __init__(self):
+        self.file_tracker = None
+        self.git_tracker = None
+        self.git_backfill = None
+        self.reports = ReportScheduler()
+        self.activity = ActivityIndexer()
+
+    async def start(self):
+        """Prepare the database, replay spooled events and start background indexing and reports"""
+        await init_db()
+        spool.start()
+        self.activity.start()
+        self.reports.start()
+
+    async def stop(self):
+        """Stop all trackers and background work, and flush the spool"""
+        if self.file_tracker:
+            await asyncio.to_thread(self.file_tracker.stop)
+        if self.git_tracker:
+            self.git_tracker.stop()
+        if self.git_backfill:
+            await self.git_backfill.stop()
+        await self.reports.stop()
+        await self.activity.stop()
+        await spool.stop()
+
+    async def start_file_tracking(self, path: str, polling: Optional[bool] = None):
+        """Replace the file tracker with one watching path (polling it if asked to)"""
+        # Validated before the current tracker is replaced
+        if polling is not None and not isinstance(polling, bool):
+            raise ValueError("polling must be true or false")
+        if self.file_tracker:
+            # Joins the observer and snapshot threads, so keep it off the event loop
+            await asyncio.to_thread(self.file_tracker.stop)
+        self.file_tracker = FileTracker(path, polling)
+        self.file_tracker.start()
+        await RepoPath.create_or_update(path)
+
+    async def start_git_tracking(self, path: str, backfill_days: Optional[int] = None):
+        """Replace the Git tracker with one polling the repository at path.
+
+        With `backfill_days` (default GIT_BACKFILL_DAYS), commits from that
+        many days back are imported in the background.
+        """
+        # Validated before the current tracker is replaced
+        days = GIT_BACKFILL_DAYS if backfill_days is None else int(backfill_days)
+        if days < 0:
+            raise ValueError("backfill_days must be a non-negative integer")
+
+        if self.git_tracker:
+            self.git_tracker.stop()
+        self.git_tracker = GitTracker(path)
+        self.git_tracker.start()
+        await RepoPath.create_or_update(path)
+
+        if days > 0:
+            if self.git_backfill:
+                await self.git_backfill.stop()
+            self.git_backfill = GitBackfill(path, days)
+            self.git_backfill.start()
+
+    async def add_browser_event(self, event_type: str, url: Optional[str] = None, title: Optional[str] = None,
+                                details: Optional[Dict[str, Any]] = None) -> Optional[int]:
+        """Record a browser event; returns its id, or None if it was spooled"""
+        event = await Event.create_browser_event(event_type=event_type, url=url, title=title, details=details or {})
+        return event.id if event else None
+
+    async def clear_events(self):
+        """Delete all events, including any still spooled, the activity index and stored reports"""
+        async with self.activity.lock, self.reports.paused():
+            await Event.clear_all_events()
+        spool.clear()
+
+    async def import_events(self, path: str, fmt: str = "ndjson") -> Dict[str, int]:
+        """Import an export file; API workers upload to a temporary file and forward its path"""
+        with open(path, "rb") as f:
+            # Committed per batch so live event writes never wait long for the write lock
+            return await load_import(f, fmt, commit_rows=IMPORT_BATCH_SIZE)
+
+    async def refresh_report(self, kind: str) -> Dict[str, Any]:
+        """Regenerate a daily report or suggestions now"""
+        return await self.reports.refresh(kind)
+
+    async def revalidate_report(self, kind: str):
+        """Regenerate a daily report or suggestions in the background"""
+        self.reports.revalidate(kind)
+
+    async def status(self) -> Dict[str, Any]:
+        """Paths currently being tracked and Git backfill progress"""
+        return {
+            "file_tracking": self.file_tracker.repo_path if self.file_tracker else None,
+            "file_polling": self.file_tracker.polling if self.file_tracker else None,
+            "git_tracking": self.git_tracker.repo_path if self.git_tracker else None,
+            "git_backfill": self.git_backfill.progress() if self.git_backfill else None,
+            "spooled_bytes": spool.size - spool.offset
+        }